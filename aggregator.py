@@ -1,4 +1,59 @@
+from records import Note
+from dedup import NearDuplicateFilter
+
+def resolve_notes(aggregated, category):
+    """
+    The notes of one document_summary category, whether they are stored
+    inline or as [chapter_index, position] references.
+    """
+    items=aggregated.get("document_summary", {}).get(category, [])
+    if aggregated.get("summary_format")!="reference":
+        return items
+    chapters=aggregated["chapters"]
+    return [_resolve_ref(chapters, category, item) for item in items]
+
+def resolve_note(aggregated, category, index):
+    """
+    One document_summary note by position, or None if out of range.
+    """
+    items=aggregated.get("document_summary", {}).get(category, [])
+    if index<0 or index>=len(items):
+        return None
+    if aggregated.get("summary_format")!="reference":
+        return items[index]
+    return _resolve_ref(aggregated["chapters"], category, items[index])
+
+def _resolve_ref(chapters, category, item):
+    note=chapters[item[0]]["aggregated"][category][item[1]]
+    if len(item)>2:
+        #Merged near-duplicates: [chapter_index, position, [[c, i], ...]]
+        note=merge_sources(note, [chapters[c]["aggregated"][category][i] for c, i in item[2]])
+    return note
+
+def merge_sources(note, duplicates):
+    """
+    Copy of note standing for itself and its duplicates, with a "sources"
+    list of all their locations (its own first).
+    """
+    sources=[note.get("source")]+[d.get("source") for d in duplicates]
+    if isinstance(note, Note):
+        return note.with_sources(sources)
+    return dict(note, sources=sources)
+
 class Aggregator:
+    def __init__(self, by_reference=False, dedup_threshold=None, budget=None):
+        #Document summary as [chapter_index, position] pairs into the
+        #chapters' note lists instead of a second copy of every note
+        self.by_reference=by_reference
+        #Merge near-duplicate statements in the document summary
+        self.dedup=None
+        if dedup_threshold is not None:
+            self.dedup=NearDuplicateFilter(dedup_threshold)
+        self.merged=0
+        #budget.NoteBudget trimming the sections before aggregation
+        self.budget=budget
+        self.budget_report=None
+
     #Main
     def aggregate_document(self, sections):
         """
@@ -38,7 +93,21 @@ class Aggregator:
             ...
           }
         }
+        With by_reference, document_summary holds [chapter_index, position]
+        pairs into chapters[chapter_index].aggregated[category], and the
+        output gets summary_format: "reference". Use resolve_notes and
+        resolve_note to read it either way.
+        With dedup_threshold, near-duplicate statements of a category are
+        kept once in document_summary, as a copy of the first one with a
+        "sources" list of every location (by reference:
+        [chapter_index, position, [[chapter_index, position], ...]]), and
+        the output gets deduplication: {"threshold": ..., "merged": n}.
+        Chapter note lists are left as they are.
+        With a budget, only the notes it selects are aggregated and the
+        output gets budget: {...} describing what was cut.
         """
+        if self.budget is not None:
+            sections, self.budget_report=self.budget.select(sections)
         chapters = self._group_by_chapter(sections)
         chapter_summaries=[]
         for chapter_id, chapter_sections in chapters.items():
@@ -50,10 +119,12 @@ class Aggregator:
         document_summary=self._aggregate_document_level(
             chapter_summaries
         )
-        return {
+        aggregated={
             "chapters": chapter_summaries,
             "document_summary": document_summary
         }
+        self._set_format(aggregated)
+        return aggregated
     
     #Chapter Grouping
     def _group_by_chapter(self, sections):
@@ -75,14 +146,26 @@ class Aggregator:
             "contradictions": [],
             "facts": []
         }
-        #Track page range
-        page_starts=[]
-        page_ends=[]
         #Collect from all sections
         for sec in sections:
             summary = sec["summary"]
             for k in combined.keys():
                 combined[k].extend(summary.get(k, []))
+        page_range=self._page_range(sections)
+        return {
+            "chapter_id": chapter_id,
+            "sections_included": [
+                s.get("section_id") for s in sections
+            ],
+            "page_range": page_range,
+            "aggregated": combined
+        }
+
+    def _page_range(self, sections):
+        #Track page range
+        page_starts=[]
+        page_ends=[]
+        for sec in sections:
             #Track page numbers
             if sec.get("page_start") is not None:
                 page_starts.append(sec["page_start"])
@@ -92,14 +175,47 @@ class Aggregator:
         page_range=None
         if page_starts and page_ends:
             page_range=[min(page_starts), max(page_ends)]
-        return {
-            "chapter_id": chapter_id,
-            "sections_included": [
-                s.get("section_id") for s in sections
-            ],
-            "page_range": page_range,
-            "aggregated": combined
-        }
+        return page_range
+
+    #Incremental Update
+    def update_document(self, aggregated, sections, changed_chapters):
+        """
+        Patches a previous aggregate_document output in place for a new
+        revision's summarized sections. Chapters not in changed_chapters
+        keep their existing entry (only the page range is refreshed); the
+        others are re-aggregated. The document summary is then rebuilt
+        from the chapter list.
+        """
+        existing={ch["chapter_id"]: ch for ch in aggregated.get("chapters", [])}
+        chapter_summaries=[]
+        for chapter_id, chapter_sections in self._group_by_chapter(sections).items():
+            chapter=existing.get(chapter_id)
+            if chapter is None or chapter_id in changed_chapters:
+                chapter=self._aggregate_chapter(chapter_id, chapter_sections)
+            else:
+                chapter["page_range"]=self._page_range(chapter_sections)
+            chapter_summaries.append(chapter)
+        aggregated["chapters"]=chapter_summaries
+        aggregated["document_summary"]=self._aggregate_document_level(
+            chapter_summaries
+        )
+        self._set_format(aggregated)
+        return aggregated
+
+    def _set_format(self, aggregated):
+        if self.by_reference:
+            aggregated["summary_format"]="reference"
+        else:
+            aggregated.pop("summary_format", None)
+        if self.dedup is not None:
+            aggregated["deduplication"]={
+                "threshold": self.dedup.threshold,
+                "merged": self.merged
+            }
+        else:
+            aggregated.pop("deduplication", None)
+        if self.budget_report is not None:
+            aggregated["budget"]=self.budget_report
 
     #Document Level
     def _aggregate_document_level(self, chapters):
@@ -111,8 +227,33 @@ class Aggregator:
             "contradictions": [],
             "facts": []
         }
-        for ch in chapters:
+        for chapter_idx, ch in enumerate(chapters):
             agg=ch["aggregated"]
             for k in doc.keys():
-                doc[k].extend(agg.get(k, []))
+                if self.by_reference:
+                    doc[k].extend([chapter_idx, i] for i in range(len(agg.get(k, []))))
+                else:
+                    doc[k].extend(agg.get(k, []))
+        self.merged=0
+        if self.dedup is not None:
+            for k in doc.keys():
+                doc[k]=self._deduplicate(chapters, k, doc[k])
         return doc
+
+    #Near-duplicate merging
+    def _deduplicate(self, chapters, category, items):
+        if self.by_reference:
+            notes=[chapters[c]["aggregated"][category][i] for c, i in items]
+        else:
+            notes=items
+        kept=[]
+        for idx, duplicates in self.dedup.groups(notes):
+            if not duplicates:
+                kept.append(items[idx])
+                continue
+            self.merged+=len(duplicates)
+            if self.by_reference:
+                kept.append(items[idx]+[[items[d] for d in duplicates]])
+            else:
+                kept.append(merge_sources(notes[idx], [notes[d] for d in duplicates]))
+        return kept
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from pdf_reader import stream_document
+from pipeline import process_document
+from sentence_processor import NLPConfig, get_nlp, DEFAULT_MODEL
+from output_writer import JsonStreamWriter, NdjsonWriter
+from output_store import write_sqlite
+from checkpoint import SectionJournal
+from metrics import PipelineMetrics, JsonLinesSink, PrometheusTextfileSink
+
+OUTPUT_SUFFIXES = {
+    "json": ".json",
+    "compact": ".json",
+    "ndjson": ".ndjson",
+    "sqlite": ".sqlite"
+}
+
+#Set in each worker process by _init_worker
+_worker_config = None
+_worker_metrics_dir = None
+
+def _init_worker(model, use_senter, metrics_dir=None):
+    global _worker_config, _worker_metrics_dir
+    _worker_config = NLPConfig(model, use_senter=use_senter)
+    _worker_metrics_dir = metrics_dir
+    #Load the model once per worker, before the first document arrives
+    get_nlp(_worker_config)
+
+def compress_pdf(file_path, output_path, output_format="json", nlp_config=None, metrics=None):
+    """
+    Runs one PDF through the pipeline and writes its output in
+    output_format. Summarized sections are checkpointed to
+    <output_path>.journal while it runs, so a worker that dies part way
+    resumes from there next time. metrics is passed on to process_document.
+    Returns a small status dict; raises on failure.
+    """
+    started = time.time()
+    doc_structure = stream_document(file_path)
+    if doc_structure is None:
+        raise ValueError(f"Could not open PDF: {file_path}")
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{output_path}.part"
+    journal_path = f"{output_path}.journal"
+    journal = SectionJournal(journal_path)
+    options = {"compact": True, "nlp_config": nlp_config, "checkpoint": journal, "metrics": metrics}
+    try:
+        if output_format == "ndjson":
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                writer = NdjsonWriter(f)
+                writer.write_header(doc_structure.get("doc_id"), doc_structure.get("metadata", {}))
+                result = process_document(doc_structure, on_section=writer.write_section, **options)
+                writer.write_footer(result)
+        else:
+            result = process_document(doc_structure, **options)
+            if output_format == "sqlite":
+                write_sqlite(result, tmp_path)
+            else:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    JsonStreamWriter(f, indent=None if output_format == "compact" else 2).write(result)
+    finally:
+        journal.close()
+    #Only complete outputs ever appear under the final name
+    os.replace(tmp_path, output_path)
+    os.remove(journal_path)
+    stats = result.get("explainability", {}).get("statistics", {})
+    return {
+        "chapters": stats.get("total_chapters", 0),
+        "items": stats.get("total_items", 0),
+        "resumed_sections": journal.resumed,
+        "seconds": round(time.time() - started, 2)
+    }
+
+def _run_job(file_path, output_path, output_format):
+    if _worker_metrics_dir is None:
+        return compress_pdf(file_path, output_path, output_format, _worker_config)
+    #One sink file per worker process, so workers never share a file
+    pid = os.getpid()
+    jsonl = JsonLinesSink(os.path.join(_worker_metrics_dir, f"metrics_{pid}.jsonl"))
+    prom = PrometheusTextfileSink(os.path.join(_worker_metrics_dir, f"compression_{pid}.prom"))
+    try:
+        return compress_pdf(file_path, output_path, output_format, _worker_config,
+                            PipelineMetrics(per_section=False, sinks=[jsonl, prom]))
+    finally:
+        jsonl.close()
+
+class JobManifest:
+    """
+    Per-file status of a batch run, saved as JSON after every change:
+    {"files": {"<pdf path>": {"status": "pending"|"running"|"done"|"failed",
+                              "output": "...", "error": "...", ...}}}
+    The file is replaced atomically, so an interrupted run leaves either the
+    previous or the new state behind, and the next run picks up from it.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def pending(self, retry_failed=False):
+        """
+        Files still to do: new, interrupted while running, failed when
+        retry_failed, or done but with their output missing.
+        """
+        todo = []
+        for file_path, entry in self.files.items():
+            status = entry.get("status")
+            if status == "done" and Path(entry["output"]).exists():
+                continue
+            if status == "failed" and not retry_failed:
+                continue
+            todo.append(file_path)
+        return todo
+
+    def add(self, file_path, output_path):
+        entry = self.files.setdefault(file_path, {"status": "pending"})
+        entry["output"] = output_path
+
+    def update(self, file_path, **fields):
+        self.files[file_path].update(fields)
+
+    def counts(self):
+        counts = {}
+        for entry in self.files.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+def find_pdfs(source):
+    """
+    PDFs of a directory (recursively, sorted), or the paths listed one per
+    line in a text file. Returns [(pdf_path, relative_output_stem)].
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [
+            (str(p), str(p.relative_to(source).with_suffix("")))
+            for p in sorted(source.rglob("*"))
+            if p.is_file() and p.suffix.lower() == ".pdf"
+        ]
+    pdfs = []
+    seen = {}
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            stem = Path(line).stem
+            #Same file name from different folders
+            n = seen.get(stem, 0)
+            seen[stem] = n + 1
+            pdfs.append((line, stem if n == 0 else f"{stem}_{n}"))
+    return pdfs
+
+def run_batch(source, output_dir, manifest_path=None, workers=1, output_format="json",
+              model=DEFAULT_MODEL, use_senter=False, retry_failed=False, metrics_dir=None):
+    """
+    Compresses every PDF of source into output_dir, one output per
+    document, across workers processes that each keep a loaded model.
+    With metrics_dir, every worker writes per-section metrics as JSON lines
+    and the totals of its last document as a Prometheus textfile there.
+    Returns the manifest's status counts.
+    """
+    manifest = JobManifest(manifest_path or Path(output_dir) / "manifest.json")
+    for pdf, stem in find_pdfs(source):
+        manifest.add(pdf, str(Path(output_dir) / (stem + OUTPUT_SUFFIXES[output_format])))
+    todo = manifest.pending(retry_failed)
+    skipped = len(manifest.files) - len(todo)
+    print(f"{len(todo)} PDFs to process, {skipped} already handled")
+    manifest.save()
+    if not todo:
+        return manifest.counts()
+    if metrics_dir is not None:
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model, use_senter, metrics_dir)) as pool:
+        futures = {}
+        for file_path in todo:
+            output_path = manifest.files[file_path]["output"]
+            futures[pool.submit(_run_job, file_path, output_path, output_format)] = file_path
+            manifest.update(file_path, status="running", error=None)
+        manifest.save()
+        try:
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    manifest.update(file_path, status="done", **future.result())
+                    print(f"Done: {file_path}")
+                except Exception as e:
+                    manifest.update(file_path, status="failed", error=str(e))
+                    print(f"Failed: {file_path}: {str(e)}")
+                manifest.save()
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            manifest.save()
+            raise
+    return manifest.counts()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compress a directory (or a list file) of PDFs, resuming interrupted runs."
+    )
+    parser.add_argument("source", help="directory of PDFs, or a text file with one PDF path per line")
+    parser.add_argument("-o", "--output-dir", default="outputs", help="where outputs go (default: outputs)")
+    parser.add_argument("-m", "--manifest", help="job manifest path (default: <output-dir>/manifest.json)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("-f", "--format", choices=sorted(OUTPUT_SUFFIXES), default="json",
+                        help="output format (default: json)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"spaCy model (default: {DEFAULT_MODEL})")
+    parser.add_argument("--use-senter", action="store_true",
+                        help="split sentences with senter instead of the parser")
+    parser.add_argument("--retry-failed", action="store_true", help="process failed files again")
+    parser.add_argument("--metrics-dir",
+                        help="write per-worker metrics (JSON lines and Prometheus textfiles) here")
+    args = parser.parse_args(argv)
+    if not Path(args.source).exists():
+        print(f"Error: File not found: {args.source}")
+        return 1
+    try:
+        counts = run_batch(
+            args.source, args.output_dir, args.manifest, args.workers, args.format,
+            args.model, args.use_senter, args.retry_failed, args.metrics_dir
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume.")
+        return 130
+    print("Summary: " + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    return 1 if counts.get("failed") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
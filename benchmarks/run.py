@@ -0,0 +1,232 @@
+"""
+Synthetic long-document benchmarks for the pipeline.
+
+For each scale a seeded synthetic document (see synthetic.py) is run
+through the five stages one at a time to time each of them, then once more
+through process_document under tracemalloc for the peak memory and the
+size of the JSON output:
+
+    python benchmarks/run.py                         # all scales, stub model
+    python benchmarks/run.py -s small -s medium
+    python benchmarks/run.py --model en_core_web_md  # real spaCy model
+    python benchmarks/run.py --update-baselines      # record new baselines
+    python benchmarks/run.py --compare               # check for regressions
+
+With --compare, results are checked against benchmarks/baselines.json: a
+stage whose sentences/sec drops, or a peak memory or output size that
+grows, by more than --threshold (default 20%) is reported as a regression
+and the run exits with status 1. Baselines are absolute numbers, per model
+and per machine, so record them with --update-baselines on the machine
+that runs the check; the committed file only holds an example.
+
+The default stub model (stub_nlp.py) needs no download and no network, so
+its timings cover everything around NER; use --model to include it.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from pipeline import process_document, iter_sections
+from sentence_processor import SentenceProcessor, NLPConfig
+from classifier import Classifier
+from section_summarizer import SectionSummarizer
+from aggregator import Aggregator
+from explainability import Explainability
+from records import json_default
+from stub_nlp import StubNLP
+from synthetic import make_document
+
+#name: (chapters, sections per chapter, sentences per section)
+SCALES = {
+    "small": (5, 5, 20),
+    "medium": (20, 10, 30),
+    "large": (50, 20, 40)
+}
+STAGES = ("sentence_processing", "classification", "summarization", "aggregation", "explainability")
+DEFAULT_BASELINES = os.path.join(HERE, "baselines.json")
+#Stages faster than this at a scale are too noisy to check for regressions
+MIN_CHECKED_SECONDS = 0.01
+
+def run_stages(doc, nlp, compact=True):
+    """
+    Times Steps 1-5 separately over the whole document. Returns
+    {stage: seconds} and the number of sentences.
+    """
+    sp = SentenceProcessor(compact=compact, nlp=nlp)
+    cl = Classifier()
+    ss = SectionSummarizer()
+    sections = list(iter_sections(doc))
+    timings = {}
+    started = time.perf_counter()
+    processed = [sp.process_section(s) for s in sections]
+    timings["sentence_processing"] = time.perf_counter() - started
+    started = time.perf_counter()
+    classified = [cl.classify_sentences(p) for p in processed]
+    timings["classification"] = time.perf_counter() - started
+    started = time.perf_counter()
+    summarized = [ss.summarize_section(c) for c in classified]
+    timings["summarization"] = time.perf_counter() - started
+    started = time.perf_counter()
+    aggregated = Aggregator().aggregate_document(summarized)
+    timings["aggregation"] = time.perf_counter() - started
+    started = time.perf_counter()
+    Explainability().generate_report(aggregated)
+    timings["explainability"] = time.perf_counter() - started
+    return timings, sum(len(p["sentences"]) for p in processed)
+
+def run_document(doc, nlp, compact=True):
+    """
+    One full process_document run under tracemalloc. Returns the peak
+    traced memory in bytes and the JSON output's size in bytes.
+    """
+    tracemalloc.start()
+    try:
+        result = process_document(doc, compact=compact, nlp=nlp)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    output = json.dumps(result, ensure_ascii=False, default=json_default)
+    return peak, len(output.encode("utf-8"))
+
+def benchmark(scale, nlp, repeat=3, seed=0, compact=True):
+    chapters, sections, sentences = SCALES[scale]
+    doc = make_document(chapters, sections, sentences, seed=seed)
+    #Best of repeat runs: the least disturbed by the rest of the machine
+    best = None
+    for _ in range(repeat):
+        timings, n_sentences = run_stages(doc, nlp, compact)
+        if best is None:
+            best = timings
+        else:
+            best = {stage: min(best[stage], timings[stage]) for stage in STAGES}
+    peak, output_bytes = run_document(doc, nlp, compact)
+    return {
+        "chapters": chapters,
+        "sections": chapters * sections,
+        "sentences": n_sentences,
+        "input_chars": sum(len(s["raw_text"]) for c in doc["chapters"] for s in c["sections"]),
+        "seconds": {stage: round(best[stage], 6) for stage in STAGES},
+        "sentences_per_sec": {
+            stage: round(n_sentences / max(best[stage], 1e-9), 1) for stage in STAGES
+        },
+        "peak_memory_bytes": peak,
+        "output_bytes": output_bytes
+    }
+
+def compare(results, baselines, threshold):
+    """
+    Regressions of results against baselines, as messages: throughput
+    below (1 - threshold) x baseline, memory or output size above
+    (1 + threshold) x baseline. Stages that took under
+    MIN_CHECKED_SECONDS in the baseline are not checked.
+    """
+    regressions = []
+    for scale, result in results.items():
+        base = baselines.get(scale)
+        if base is None:
+            continue
+        for stage, rate in result["sentences_per_sec"].items():
+            expected = base["sentences_per_sec"].get(stage)
+            if base["seconds"].get(stage, 0) < MIN_CHECKED_SECONDS:
+                continue
+            if expected and rate < expected * (1 - threshold):
+                regressions.append(
+                    f"{scale}/{stage}: {rate:,.0f} sentences/sec, baseline {expected:,.0f}"
+                )
+        for key in ("peak_memory_bytes", "output_bytes"):
+            expected = base.get(key)
+            if expected and result[key] > expected * (1 + threshold):
+                regressions.append(f"{scale}/{key}: {result[key]:,}, baseline {expected:,}")
+    return regressions
+
+def print_result(scale, result, base=None):
+    print(f"{scale}: {result['chapters']} chapters, {result['sections']} sections, "
+          f"{result['sentences']} sentences, {result['input_chars']:,} chars")
+    for stage in STAGES:
+        rate = result["sentences_per_sec"][stage]
+        line = f"  {stage:<20} {rate:>12,.0f} sentences/sec"
+        if base:
+            line += f"  (baseline {base['sentences_per_sec'].get(stage, 0):,.0f}"
+            if base["seconds"].get(stage, 0) < MIN_CHECKED_SECONDS:
+                line += ", not checked"
+            line += ")"
+        print(line)
+    print(f"  {'peak memory':<20} {result['peak_memory_bytes'] / 2**20:>12,.1f} MiB")
+    print(f"  {'output size':<20} {result['output_bytes'] / 2**20:>12,.2f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic long documents.")
+    parser.add_argument("-s", "--scale", action="append", choices=sorted(SCALES),
+                        help="scale to run, repeatable (default: all)")
+    parser.add_argument("--model", help="spaCy model to use instead of the offline stub")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per scale, best kept (default: 3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dict-records", action="store_true",
+                        help="run with dict sentences instead of compact records")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES,
+                        help="baseline file (default: benchmarks/baselines.json)")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="store this run's results as the baselines")
+    parser.add_argument("--compare", action="store_true",
+                        help="check the results against the baselines and exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative regression (default: 0.2)")
+    parser.add_argument("-o", "--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    if args.model:
+        from sentence_processor import get_nlp
+        nlp = get_nlp(NLPConfig(args.model))
+        model = args.model
+    else:
+        nlp = StubNLP()
+        model = "stub"
+    compact = not args.dict_records
+    key = model if compact else f"{model}/dict"
+
+    stored = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            stored = json.load(f)
+    baselines = stored.get(key, {}).get("scales", {}) if args.compare else {}
+
+    results = {}
+    for scale in args.scale or list(SCALES):
+        results[scale] = benchmark(scale, nlp, args.repeat, args.seed, compact)
+        print_result(scale, results[scale], baselines.get(scale))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": key, "scales": results}, f, indent=2)
+
+    if args.update_baselines:
+        entry = stored.setdefault(key, {"scales": {}})
+        entry["scales"].update(results)
+        entry["machine"] = f"{platform.python_implementation()} {platform.python_version()}, {platform.machine()}"
+        entry["seed"] = args.seed
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+            f.write("\n")
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    if not args.compare:
+        return 0
+    if not baselines:
+        print(f"No baselines for {key} yet; run with --update-baselines to record them")
+        return 0
+    regressions = compare(results, baselines, args.threshold)
+    for message in regressions:
+        print(f"Regression: {message}")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import re
+
+#Not after the titles of PERSON entities
+_SENTENCE_END = re.compile(r"(?<!\b(?:Mr|Ms|Dr)\.)(?<=[.!?])\s+")
+#(label, pattern) in priority order; earlier matches win on overlap
+_ENTITY_PATTERNS = [
+    ("MONEY", re.compile(r"\$\d[\d,]*(?:\.\d+)?")),
+    ("PERCENT", re.compile(r"\d+(?:\.\d+)?%")),
+    ("DATE", re.compile(
+        r"\b(?:January|February|March|April|May|June|July|August|September|"
+        r"October|November|December) \d{1,2}, \d{4}\b|\b\d{4}-\d{2}-\d{2}\b|\b\d+ (?:days|months|years)\b"
+    )),
+    ("ORG", re.compile(r"\b(?:[A-Z][a-z]+ )+(?:Inc|Corp|LLC|Ltd|Authority|Agency)\b\.?")),
+    ("PERSON", re.compile(r"\b(?:Mr|Ms|Dr)\. [A-Z][a-z]+\b")),
+    ("CARDINAL", re.compile(r"\b\d[\d,]*\b"))
+]
+
+class Ent:
+    def __init__(self, text, label, start):
+        self.text = text
+        self.label_ = label
+        self.start_char = start
+
+class Span:
+    def __init__(self, text, ents):
+        self.text = text
+        self.ents = ents
+
+class Doc:
+    def __init__(self, text, sents, ents):
+        self.text = text
+        self.sents = sents
+        self.ents = ents
+
+class StubNLP:
+    """
+    Offline stand-in for a spaCy pipeline, exposing just what
+    SentenceProcessor uses: nlp(text) and nlp.pipe(texts) return docs with
+    .sents, .ents and .text. Sentences are split on end punctuation and
+    entities found with regexes, so results are deterministic and need no
+    model download. Timings measure the pipeline around the model, not NER.
+    """
+    meta = {"name": "stub", "version": "1.0"}
+
+    def __call__(self, text):
+        ents = self._entities(text)
+        sents = []
+        start = 0
+        for part in _SENTENCE_END.split(text):
+            if not part:
+                continue
+            start = text.find(part, start)
+            end = start + len(part)
+            sents.append(Span(part, [e for e in ents if start <= e.start_char < end]))
+            start = end
+        return Doc(text, sents, ents)
+
+    def pipe(self, texts, batch_size=None, n_process=1):
+        for text in texts:
+            yield self(text)
+
+    def _entities(self, text):
+        taken = []
+        ents = []
+        for label, pattern in _ENTITY_PATTERNS:
+            for m in pattern.finditer(text):
+                if any(m.start() < e and s < m.end() for s, e in taken):
+                    continue
+                taken.append((m.start(), m.end()))
+                ents.append(Ent(m.group(0), label, m.start()))
+        ents.sort(key=lambda e: e.start_char)
+        return ents
@@ -0,0 +1,96 @@
+import random
+
+PARTIES = ["The operator", "The licensee", "Each contractor", "The applicant", "The board",
+           "Acme Holdings Inc", "The Port Authority", "Dr. Morgan", "The supplier"]
+ACTIONS = ["file the annual report", "notify the regulator", "maintain safety records",
+           "pay the registration fee", "submit an audit plan", "renew the permit",
+           "inspect the equipment", "disclose material changes"]
+MONTHS = ["January", "March", "June", "September", "November"]
+
+#Sentence templates by the type the classifier should give them
+TEMPLATES = {
+    "rule": [
+        "{party} must {action} within {n} days.",
+        "{party} shall {action} no later than {date}.",
+        "{party} is required to {action} every {n} months."
+    ],
+    "exception": [
+        "{party} must {action} within {n} days unless exempted by the Port Authority.",
+        "This section does not apply to contracts below ${amount}.",
+        "{party} shall {action}, except where the permit was waived before {date}."
+    ],
+    "constraint": [
+        "Fees are capped at ${amount} per application.",
+        "Emissions must not exceed {pct}% of the licensed volume.",
+        "No more than {n} inspections are allowed per year."
+    ],
+    "risk": [
+        "Failure to {action} may result in a penalty of ${amount}.",
+        "Any breach of this clause exposes {party_lc} to a fine of {pct}% of turnover."
+    ],
+    "contradiction": [
+        "However, {party_lc} may {action} after {n} days in urgent cases.",
+        "Nevertheless, the deadline of {date} remains in force."
+    ],
+    "fact": [
+        "The program was introduced to improve transparency in the sector.",
+        "Historically, reporting practices varied widely between regions.",
+        "For example, a small operator typically handles a few dozen shipments.",
+        "The committee met in {date} to review the draft."
+    ]
+}
+
+#Share of each sentence type; narrative "fact" text dominates real filings
+DEFAULT_MIX = {
+    "rule": 0.2, "exception": 0.08, "constraint": 0.08,
+    "risk": 0.06, "contradiction": 0.04, "fact": 0.54
+}
+
+def make_sentence(rng, kind):
+    party = rng.choice(PARTIES)
+    return rng.choice(TEMPLATES[kind]).format(
+        party=party,
+        party_lc=party[0].lower() + party[1:] if party.startswith("The") else party,
+        action=rng.choice(ACTIONS),
+        n=rng.randint(2, 90),
+        amount=f"{rng.randint(1, 500) * 100:,}",
+        pct=rng.randint(1, 40),
+        date=f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(2015, 2030)}"
+    )
+
+def make_document(chapters=10, sections=10, sentences=20, seed=0, mix=None, repeat_ratio=0.1):
+    """
+    Seeded doc_structure in process_document's input format with
+    chapters x sections x sentences sentences. mix gives the share of each
+    sentence type (see DEFAULT_MIX); repeat_ratio is the share of sentences
+    that repeat an earlier one verbatim, like boilerplate in real filings.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    seen = []
+    doc = {"doc_id": f"synthetic_{chapters}x{sections}x{sentences}_{seed}", "chapters": []}
+    page = 1
+    for c in range(1, chapters + 1):
+        chapter = {"chapter_id": str(c), "sections": []}
+        for s in range(1, sections + 1):
+            text = []
+            for _ in range(sentences):
+                if seen and rng.random() < repeat_ratio:
+                    sentence = rng.choice(seen)
+                else:
+                    sentence = make_sentence(rng, rng.choices(kinds, weights)[0])
+                    if len(seen) < 500:
+                        seen.append(sentence)
+                text.append(sentence)
+            pages = max(1, sentences // 15)
+            chapter["sections"].append({
+                "section_id": f"{c}.{s}",
+                "Title": f"Section {c}.{s}",
+                "page_range": [page, page + pages - 1],
+                "raw_text": " ".join(text)
+            })
+            page += pages
+        doc["chapters"].append(chapter)
+    return doc
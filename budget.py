@@ -0,0 +1,197 @@
+import heapq
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#Base score of a note by type
+TYPE_WEIGHTS = {
+    "exception": 1.0,
+    "contradiction": 1.0,
+    "risk": 0.9,
+    "rule": 0.8,
+    "constraint": 0.7,
+    "fact": 0.3
+}
+IMPORTANCE_WEIGHTS = {"high": 0.2, "medium": 0.1, "low": 0.0}
+CRITICAL_ENTITIES = ("numbers", "dates", "money", "percentages")
+
+_WORD = re.compile(r"\w+")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    """
+    Rough token count of text: words and punctuation marks.
+    """
+    return len(_TOKEN.findall(text or ""))
+
+class NoteBudget:
+    """
+    Keeps the output of a document bounded: notes are scored numerically
+    and only the best ones that fit max_notes and/or max_tokens survive,
+    per document or per chapter (per="chapter").
+    The score adds up the note type, its importance label, its
+    decision-critical entities, how early it comes in its section and,
+    when word vectors are given (e.g. the vocab.vectors of
+    en_core_web_md), how close it is to its section's centroid; the
+    similarities are computed section by section in NumPy.
+    Notes are taken best first from a heap; a note that does not fit the
+    remaining tokens is skipped for smaller ones. Kept notes keep their
+    document order.
+    """
+    def __init__(self, max_notes=None, max_tokens=None, per="document", vectors=None):
+        if max_notes is None and max_tokens is None:
+            raise ValueError("NoteBudget needs max_notes or max_tokens")
+        if per not in ("document", "chapter"):
+            raise ValueError("per must be 'document' or 'chapter'")
+        self.max_notes = max_notes
+        self.max_tokens = max_tokens
+        self.per = per
+        self.vectors = vectors
+        if vectors is not None and np is None:
+            print("Warning: NumPy is not installed, scoring notes without vectors")
+            self.vectors = None
+
+    #Selection
+    def select(self, sections):
+        """
+        Trims summarized sections to the budget. Returns the trimmed
+        sections (new dicts; the inputs are untouched) and a report of
+        what was cut.
+        """
+        groups = {}
+        scored = []
+        for sec in sections:
+            key = sec.get("chapter_id", "unknown") if self.per == "chapter" else None
+            entries = [
+                (score, len(scored) + i, note)
+                for i, (score, note) in enumerate(self.score_section(sec))
+            ]
+            scored.extend(entries)
+            groups.setdefault(key, []).extend(entries)
+        kept = set()
+        for candidates in groups.values():
+            kept.update(self._take(candidates))
+        trimmed = []
+        order = 0
+        for sec in sections:
+            summary = {}
+            for category, notes in sec.get("summary", {}).items():
+                summary[category] = [
+                    note for n, note in enumerate(notes, order) if n in kept
+                ]
+                order += len(notes)
+            trimmed.append(dict(sec, summary=summary))
+        return trimmed, self._report(scored, kept)
+
+    def _take(self, candidates):
+        heap = [(-score, order, note) for score, order, note in candidates]
+        heapq.heapify(heap)
+        taken = []
+        tokens_left = self.max_tokens
+        while heap:
+            if self.max_notes is not None and len(taken) >= self.max_notes:
+                break
+            if tokens_left is not None and tokens_left <= 0:
+                break
+            _, order, note = heapq.heappop(heap)
+            if tokens_left is not None:
+                cost = estimate_tokens(note.get("statement"))
+                if cost > tokens_left:
+                    continue
+                tokens_left -= cost
+            taken.append(order)
+        return taken
+
+    #Scoring
+    def score_section(self, summarized):
+        """
+        [(score, note), ...] for the notes of one summarized section, in
+        the order of its summary.
+        """
+        notes = [n for ns in summarized.get("summary", {}).values() for n in ns]
+        if not notes:
+            return []
+        #Earlier sentences of a section score higher
+        offsets = sorted(range(len(notes)), key=lambda i: self._offset(notes[i]))
+        position = [0.0] * len(notes)
+        for rank, i in enumerate(offsets):
+            position[i] = 1 - rank / len(notes)
+        similarity = self._centroid_similarity(notes)
+        scored = []
+        for i, note in enumerate(notes):
+            entities = note.get("entities") or {}
+            entity_score = min(0.3, 0.1 * sum(1 for k in CRITICAL_ENTITIES if entities.get(k)))
+            score = (
+                TYPE_WEIGHTS.get(note.get("type"), 0.3)
+                + IMPORTANCE_WEIGHTS.get(note.get("importance"), 0.0)
+                + entity_score
+                + 0.1 * position[i]
+                + 0.2 * similarity[i]
+            )
+            scored.append((round(score, 6), note))
+        return scored
+
+    def _offset(self, note):
+        source = note.get("source") or {}
+        return source.get("char_offset") or 0
+
+    def _centroid_similarity(self, notes):
+        if self.vectors is None:
+            return [0.0] * len(notes)
+        words = [_WORD.findall((n.get("statement") or "").lower()) for n in notes]
+        flat = [w for ws in words for w in ws]
+        if not flat:
+            return [0.0] * len(notes)
+        #One vector lookup for the whole section, then mean per note
+        rows = np.asarray(self.vectors.find(keys=flat))
+        table = np.asarray(self.vectors.data)
+        found = rows >= 0
+        word_vectors = np.zeros((len(flat), table.shape[1]), dtype="float32")
+        word_vectors[found] = table[rows[found]]
+        owner = np.repeat(np.arange(len(notes)), [len(ws) for ws in words])
+        sums = np.zeros((len(notes), table.shape[1]), dtype="float32")
+        np.add.at(sums, owner, word_vectors)
+        counts = np.bincount(owner[found], minlength=len(notes)).astype("float32")
+        means = sums / np.maximum(counts, 1)[:, None]
+        centroid = means[counts > 0].mean(axis=0) if (counts > 0).any() else None
+        if centroid is None:
+            return [0.0] * len(notes)
+        norms = np.linalg.norm(means, axis=1) * np.linalg.norm(centroid)
+        cosine = np.where(norms > 0, means @ centroid / np.maximum(norms, 1e-12), 0.0)
+        return [max(0.0, float(c)) for c in cosine]
+
+    #Report
+    def _report(self, scored, kept):
+        cut_by_type = {}
+        cut_by_importance = {}
+        kept_tokens = 0
+        cut_tokens = 0
+        kept_scores = []
+        for score, order, note in scored:
+            tokens = estimate_tokens(note.get("statement"))
+            if order in kept:
+                kept_tokens += tokens
+                kept_scores.append(score)
+                continue
+            cut_tokens += tokens
+            t = note.get("type")
+            cut_by_type[t] = cut_by_type.get(t, 0) + 1
+            imp = note.get("importance", "low")
+            cut_by_importance[imp] = cut_by_importance.get(imp, 0) + 1
+        return {
+            "per": self.per,
+            "max_notes": self.max_notes,
+            "max_tokens": self.max_tokens,
+            "vectors": self.vectors is not None,
+            "notes_considered": len(scored),
+            "notes_kept": len(kept),
+            "notes_cut": len(scored) - len(kept),
+            "tokens_kept": kept_tokens,
+            "tokens_cut": cut_tokens,
+            "cut_by_type": cut_by_type,
+            "cut_by_importance": cut_by_importance,
+            "lowest_kept_score": min(kept_scores) if kept_scores else None
+        }
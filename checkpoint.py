@@ -0,0 +1,58 @@
+import json
+import os
+from records import json_default
+
+class SectionJournal:
+    """
+    Append-only checkpoint of summarized sections for one document, one
+    JSON line per section:
+    {"ordinal": 12, "section_id": "3.4", "content_hash": "...", "summarized": {...}}
+    Each line is flushed (and fsynced, unless fsync=False) as soon as the
+    section is done. When process_document runs again with the same
+    journal, sections whose position, section_id and content hash match an
+    entry are taken from it instead of being processed. A line cut short
+    by a crash is dropped on open. Delete the file once the output has been
+    written.
+    """
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.entries = {}
+        self.resumed = 0
+        good_size = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                        key = (record["ordinal"], record["section_id"], record["content_hash"])
+                        self.entries[key] = record["summarized"]
+                    except (ValueError, KeyError, TypeError):
+                        #Torn write at the end of the journal
+                        break
+                    good_size += len(line)
+            with open(path, "r+b") as f:
+                f.truncate(good_size)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def get(self, ordinal, section_id, content_hash):
+        summarized = self.entries.get((ordinal, section_id, content_hash))
+        if summarized is not None:
+            self.resumed += 1
+        return summarized
+
+    def append(self, ordinal, section_id, content_hash, summarized):
+        self._file.write(json.dumps({
+            "ordinal": ordinal,
+            "section_id": section_id,
+            "content_hash": content_hash,
+            "summarized": summarized
+        }, ensure_ascii=False, default=json_default) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
@@ -1,4 +1,5 @@
 import re
+from records import Note
 
 class Classifier:
     def __init__(self):
@@ -28,20 +29,29 @@ class Classifier:
             "nevertheless", "although", "despite",
             "conversely", "in contrast", "whereas"
         ]
+        #Built from the keyword lists on first use
+        self._matcher=None
 
     #Main
     def classify_sentences(self, processed_section):
+        sentences=processed_section["sentences"]
+        labels=self.classify_batch([s["text"] for s in sentences])
         results=[]
-        for s in processed_section["sentences"]:
-            text=s["text"]
-            label=self.classify_text(text)
-            results.append({
-                "sentence_id": s["sentence_id"],
-                "text": text,
-                "type": label,
-                "entities": s["entities"],
-                "source": s["source"]
-            })
+        if sentences and isinstance(sentences[0], Note):
+            #Compact mode: label the records in place instead of copying them
+            for note, label in zip(sentences, labels):
+                note.type=label
+            results=sentences
+        else:
+            for s, label in zip(sentences, labels):
+                text=s["text"]
+                results.append({
+                    "sentence_id": s["sentence_id"],
+                    "text": text,
+                    "type": label,
+                    "entities": s["entities"],
+                    "source": s["source"]
+                })
         return {
             "chapter_id": processed_section.get("chapter_id"),
             "section_id": processed_section.get("section_id"),
@@ -53,31 +63,62 @@ class Classifier:
 
     #Classification Logic
     def classify_text(self, text):
-        t=text.lower()
-        #Priority order is critical
-        #Exceptions
-        if self._contains(t, self.exception_keywords):
-            return "exception"
-        #Contradictions
-        if self._contains(t, self.contradiction_keywords):
-            return "contradiction"
-        # Risks
-        if self._contains(t, self.risk_keywords):
-            return "risk"
-        #Constraints
-        if self._contains(t, self.constraint_keywords):
-            return "constraint"
-        #Rules
-        if self._contains(t, self.rule_keywords):
-            return "rule"
+        matcher=self._get_matcher()
+        best=None
+        for m in matcher.finditer(text.lower()):
+            rank=self._rank[m.lastgroup]
+            if best is None or rank < best:
+                best=rank
+                if best==0:
+                    break
         #Default-factual information
-        return "fact"
-    
+        if best is None:
+            return "fact"
+        return self._labels[best]
+
+    def classify_batch(self, texts):
+        """
+        Labels a whole list of texts (e.g. every sentence of a section)
+        with the same matcher; returns one label per text, in order.
+        """
+        classify=self.classify_text
+        return [classify(t) for t in texts]
+
+    def fingerprint(self):
+        """
+        The keyword configuration, for keying cached results.
+        """
+        return {
+            "rule": self.rule_keywords,
+            "exception": self.exception_keywords,
+            "constraint": self.constraint_keywords,
+            "risk": self.risk_keywords,
+            "contradiction": self.contradiction_keywords
+        }
+
     #Helper function
-    def _contains(self, text, keywords):
-        for k in keywords:
+    def _get_matcher(self):
+        """
+        Compiles all keyword lists into one regex. A lookahead tries every
+        position against all categories, highest priority first, so one
+        finditer scan reports each category hit with the same word-boundary
+        semantics as checking the keywords one by one.
+        """
+        if self._matcher is None:
+            #Priority order is critical
+            categories=[
+                ("exception", self.exception_keywords),
+                ("contradiction", self.contradiction_keywords),
+                ("risk", self.risk_keywords),
+                ("constraint", self.constraint_keywords),
+                ("rule", self.rule_keywords)
+            ]
+            self._labels=[label for label, _ in categories]
+            self._rank={label: i for i, label in enumerate(self._labels)}
+            groups=[
+                f"(?P<{label}>" + "|".join(re.escape(k) for k in keywords) + ")"
+                for label, keywords in categories
+            ]
             #Word boundary check to avoid partial matches
-            pattern = r"\b" + re.escape(k) + r"\b"
-            if re.search(pattern, text):
-                return True
-        return False
+            self._matcher=re.compile(r"(?=\b(?:" + "|".join(groups) + r")\b)")
+        return self._matcher
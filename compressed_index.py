@@ -0,0 +1,125 @@
+from bisect import bisect_right
+from aggregator import resolve_notes
+from pipeline import drill_down_payload
+
+class CompressedIndex:
+    """
+    Lookup tables over the document_summary notes of a process_document
+    output, built once. Notes can be found by section_id, page, note type,
+    importance and entity value without scanning the summary:
+        index = CompressedIndex(result)
+        index.by_entity("$10,000")
+        index.find(page=12, importance="high")
+    Results are get_drill_down payloads in document_summary order;
+    positions() gives the matching (category, index) pairs instead.
+    """
+    def __init__(self, compressed_output):
+        aggregated = compressed_output.get("analysis", {})
+        self.positions_list = []
+        self.notes = []
+        self.sections = {}
+        self.types = {}
+        self.importance = {}
+        self.entities = {}
+        self.entity_kinds = {}
+        spans = []
+        for category in aggregated.get("document_summary", {}):
+            for index, note in enumerate(resolve_notes(aggregated, category)):
+                item = len(self.notes)
+                self.positions_list.append((category, index))
+                self.notes.append(note)
+                #A merged note is found at every location it stands for
+                sources = note.get("sources") or [note.get("source") or {}]
+                for section_id in {source.get("section_id") for source in sources}:
+                    self.sections.setdefault(section_id, []).append(item)
+                self.types.setdefault(note.get("type"), []).append(item)
+                self.importance.setdefault(note.get("importance"), []).append(item)
+                for kind, values in (note.get("entities") or {}).items():
+                    for value in set(values):
+                        key = self._entity_key(value)
+                        self.entities.setdefault(key, []).append(item)
+                        self.entity_kinds.setdefault((kind, key), []).append(item)
+                for source in sources:
+                    start, end = source.get("page_start"), source.get("page_end")
+                    if start is not None:
+                        spans.append((start, start if end is None else end, item))
+        #Page intervals sorted by start; no interval is longer than max_span,
+        #so a page query only has to look back that far from its position
+        spans.sort()
+        self._starts = [s for s, _, _ in spans]
+        self._spans = spans
+        self._max_span = max((e - s for s, e, _ in spans), default=0)
+
+    def _entity_key(self, value):
+        return " ".join(str(value).split()).casefold()
+
+    #Lookups
+    def by_section(self, section_id):
+        return self.find(section_id=section_id)
+
+    def by_page(self, page):
+        return self.find(page=page)
+
+    def by_type(self, note_type):
+        return self.find(note_type=note_type)
+
+    def by_importance(self, importance):
+        return self.find(importance=importance)
+
+    def by_entity(self, value, kind=None):
+        """
+        Notes with an entity equal to value (ignoring case and spacing);
+        kind restricts it to one entity list, e.g. "organizations".
+        """
+        return self.find(entity=value, entity_kind=kind)
+
+    def find(self, section_id=None, page=None, note_type=None, importance=None,
+             entity=None, entity_kind=None):
+        """
+        Notes matching every given criterion, as drill-down payloads.
+        """
+        return [drill_down_payload(self.notes[item]) for item in self._match(
+            section_id, page, note_type, importance, entity, entity_kind
+        )]
+
+    def positions(self, section_id=None, page=None, note_type=None, importance=None,
+                  entity=None, entity_kind=None):
+        """
+        Same as find, as (category, index) pairs for get_drill_down.
+        """
+        return [self.positions_list[item] for item in self._match(
+            section_id, page, note_type, importance, entity, entity_kind
+        )]
+
+    def _match(self, section_id, page, note_type, importance, entity, entity_kind):
+        candidates = []
+        if section_id is not None:
+            candidates.append(self.sections.get(section_id, []))
+        if page is not None:
+            candidates.append(self._page_items(page))
+        if note_type is not None:
+            candidates.append(self.types.get(note_type, []))
+        if importance is not None:
+            candidates.append(self.importance.get(importance, []))
+        if entity is not None:
+            key = self._entity_key(entity)
+            if entity_kind is None:
+                candidates.append(self.entities.get(key, []))
+            else:
+                candidates.append(self.entity_kinds.get((entity_kind, key), []))
+        if not candidates:
+            return []
+        #Intersect starting from the smallest list
+        candidates.sort(key=len)
+        matched = candidates[0]
+        for other in candidates[1:]:
+            if not matched:
+                break
+            other = set(other)
+            matched = [item for item in matched if item in other]
+        return sorted(set(matched))
+
+    def _page_items(self, page):
+        hi = bisect_right(self._starts, page)
+        lo = bisect_right(self._starts, page - self._max_span - 1)
+        return sorted(item for _, end, item in self._spans[lo:hi] if end >= page)
@@ -0,0 +1,99 @@
+import random
+import re
+import zlib
+
+#Entities that must agree for two statements to count as duplicates:
+#"pay $10 within 10 days" and "pay $20 within 10 days" are different rules
+CRITICAL_ENTITIES = ("numbers", "dates", "money", "percentages")
+
+_WORD = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+
+class NearDuplicateFilter:
+    """
+    Groups near-duplicate statements with MinHash signatures and
+    locality-sensitive hashing, so the work grows roughly linearly with the
+    number of notes instead of comparing every pair.
+    Statements are compared as sets of word shingles. The signature is cut
+    into bands; notes sharing a band bucket with an earlier kept note are
+    checked with the exact Jaccard similarity of their shingles, and merged
+    into it when that reaches threshold and their critical entities match.
+    Identical statements are merged without hashing.
+    """
+    def __init__(self, threshold=0.7, num_perm=64, bands=16, shingle_size=2, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+
+    def groups(self, notes):
+        """
+        Returns [(kept_index, [duplicate_index, ...]), ...] for notes, in
+        order of first appearance; every note is in exactly one group.
+        """
+        groups = []
+        kept = []
+        exact = {}
+        buckets = {}
+        for idx, note in enumerate(notes):
+            words = _WORD.findall((note.get("statement") or "").lower())
+            guard = self._guard(note)
+            text_key = (" ".join(words), guard)
+            group = exact.get(text_key)
+            if group is not None:
+                groups[group][1].append(idx)
+                continue
+            shingles = self._shingles(words)
+            signature = self._signature(shingles)
+            bands = [
+                (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(self.bands)
+            ]
+            group = self._match(bands, buckets, kept, shingles, guard)
+            if group is not None:
+                groups[group][1].append(idx)
+                exact[text_key] = group
+                continue
+            group = len(groups)
+            groups.append((idx, []))
+            kept.append((shingles, guard))
+            exact[text_key] = group
+            for band in bands:
+                buckets.setdefault(band, []).append(group)
+        return groups
+
+    def _match(self, bands, buckets, kept, shingles, guard):
+        seen = set()
+        for band in bands:
+            for group in buckets.get(band, ()):
+                if group in seen:
+                    continue
+                seen.add(group)
+                other, other_guard = kept[group]
+                if other_guard == guard and self._jaccard(shingles, other) >= self.threshold:
+                    return group
+        return None
+
+    def _guard(self, note):
+        entities = note.get("entities") or {}
+        return tuple(frozenset(entities.get(k) or ()) for k in CRITICAL_ENTITIES)
+
+    def _shingles(self, words):
+        n = self.shingle_size
+        if len(words) <= n:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+    def _signature(self, shingles):
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _jaccard(self, a, b):
+        union = len(a | b)
+        return len(a & b) / union if union else 1.0
@@ -1,3 +1,5 @@
+from aggregator import resolve_notes
+
 class Explainability:
 
     def generate_report(self, aggregated_output):
@@ -23,12 +25,15 @@ class Explainability:
         loss=self._estimate_loss(aggregated_output)
         trace=self._verify_traceability(aggregated_output)
         stats=self._generate_statistics(aggregated_output)
-        return {
+        report={
             "compression_policy": policy,
             "information_loss": loss,
             "traceability": trace,
             "statistics": stats
         }
+        if aggregated_output.get("budget"):
+            report["budget"]=self._budget_report(aggregated_output["budget"])
+        return report
     #Policy
     def _compression_policy(self):
         return {
@@ -63,7 +68,7 @@ class Explainability:
         medium_importance=0
         low_importance=0
         for k in aggregated["document_summary"].keys():
-            items=aggregated["document_summary"][k]
+            items=resolve_notes(aggregated, k)
             for item in items:
                 total+=1
                 imp=item.get("importance", "low")
@@ -73,6 +78,9 @@ class Explainability:
                     medium_importance+=1
                 else:
                     low_importance+=1
+        return self._loss_report(total, high_importance, medium_importance, low_importance)
+
+    def _loss_report(self, total, high_importance, medium_importance, low_importance):
         #Calculate loss level
         if total==0:
             level="unknown"
@@ -119,27 +127,34 @@ class Explainability:
         incomplete=[]
         total_checked=0
         for k in aggregated["document_summary"].keys():
-            for note in aggregated["document_summary"][k]:
+            for note in resolve_notes(aggregated, k):
                 total_checked+=1
-                src=note.get("source")
-                if not src:
-                    missing.append({
-                        "statement": note.get("statement"),
-                        "type": note.get("type"),
-                        "issue": "No source provided"
-                    })
-                elif not src.get("section_id"):
-                    incomplete.append({
-                        "statement": note.get("statement"),
-                        "type": note.get("type"),
-                        "issue": "Missing section_id in source"
-                    })
-                elif not src.get("page_start") and not src.get("page_end"):
-                    incomplete.append({
-                        "statement": note.get("statement"),
-                        "type": note.get("type"),
-                        "issue": "Missing page information in source"
-                    })
+                issue=self._source_issue(note)
+                if issue is None:
+                    continue
+                if issue["issue"]=="No source provided":
+                    missing.append(issue)
+                else:
+                    incomplete.append(issue)
+        return self._traceability_report(total_checked, missing, incomplete)
+
+    def _source_issue(self, note):
+        src=note.get("source")
+        if not src:
+            issue="No source provided"
+        elif not src.get("section_id"):
+            issue="Missing section_id in source"
+        elif not src.get("page_start") and not src.get("page_end"):
+            issue="Missing page information in source"
+        else:
+            return None
+        return {
+            "statement": note.get("statement"),
+            "type": note.get("type"),
+            "issue": issue
+        }
+
+    def _traceability_report(self, total_checked, missing, incomplete):
         all_traceable=len(missing)==0 and len(incomplete)==0
         return {
             "all_traceable": all_traceable,
@@ -151,6 +166,30 @@ class Explainability:
             )
         }
 
+    #Budget
+    def _budget_report(self, budget):
+        considered=budget["notes_considered"]
+        cut=budget["notes_cut"]
+        limits=[]
+        if budget.get("max_notes") is not None:
+            limits.append(f"{budget['max_notes']} notes")
+        if budget.get("max_tokens") is not None:
+            limits.append(f"{budget['max_tokens']} tokens")
+        if cut==0:
+            explanation=f"All {considered} notes fit the budget; nothing was cut."
+        else:
+            high_cut=budget["cut_by_importance"].get("high", 0)
+            explanation=(
+                f"{cut} of {considered} notes ({int(cut / considered * 100)}%) "
+                f"were cut to fit {' and '.join(limits)} per {budget['per']}."
+            )
+            if high_cut:
+                explanation+=(
+                    f" {high_cut} high importance notes were among them; "
+                    "recommend a larger budget or reviewing the source."
+                )
+        return dict(budget, explanation=explanation)
+
     def _calculate_traceability_score(self, total, missing, incomplete):
         if total==0:
             return 0
@@ -179,8 +218,112 @@ class Explainability:
             count=len(doc_summary[k])
             stats["items_by_type"][k] = count
             stats["total_items"] += count
-            for item in doc_summary[k]:
+            for item in resolve_notes(aggregated, k):
                 imp=item.get("importance", "low")
                 if imp in stats["items_by_importance"]:
                     stats["items_by_importance"][imp] += 1
         return stats
+
+class ReportAccumulator:
+    """
+    Builds the Explainability report in one pass, fed each summarized
+    section as it comes out of the pipeline:
+        acc = ReportAccumulator()
+        acc.add_section(summarized)   # for every section, in order
+        acc.partial()                 # live statistics at any point
+        acc.report(aggregated)        # same as generate_report(aggregated)
+    report() holds as long as document_summary is the chapters' notes in
+    order, which is what Aggregator produces without deduplication or a
+    budget.
+    """
+    def __init__(self, explainability=None):
+        self.ex=explainability or Explainability()
+        self.sections=0
+        #category -> importance label -> count
+        self.importance={}
+        #category -> chapter_id -> (missing, incomplete)
+        self.issues={}
+        self.chapter_order={}
+
+    def add_section(self, summarized):
+        self.sections+=1
+        chapter_id=summarized.get("chapter_id", "unknown")
+        self.chapter_order.setdefault(chapter_id, len(self.chapter_order))
+        for k, notes in summarized.get("summary", {}).items():
+            counts=self.importance.setdefault(k, {})
+            for note in notes:
+                imp=note.get("importance", "low")
+                counts[imp]=counts.get(imp, 0)+1
+                issue=self.ex._source_issue(note)
+                if issue is None:
+                    continue
+                missing, incomplete=self.issues.setdefault(k, {}).setdefault(chapter_id, ([], []))
+                if issue["issue"]=="No source provided":
+                    missing.append(issue)
+                else:
+                    incomplete.append(issue)
+
+    def partial(self):
+        """
+        Statistics over the sections added so far.
+        """
+        total, high, medium, low=self._counts(self.importance.keys())
+        missing, incomplete=self._issues(self.importance.keys())
+        loss=self.ex._loss_report(total, high, medium, low)
+        return {
+            "sections_processed": self.sections,
+            "chapters_seen": len(self.chapter_order),
+            "total_items": total,
+            "items_by_importance": {"high": high, "medium": medium, "low": low},
+            "traceability_score": self.ex._calculate_traceability_score(total, missing, incomplete),
+            "loss_level": loss["level"],
+            "high_importance_ratio": loss["high_importance_ratio"]
+        }
+
+    def report(self, aggregated):
+        """
+        The generate_report output for aggregated, from the counts gathered
+        section by section.
+        """
+        categories=list(aggregated["document_summary"].keys())
+        total, high, medium, low=self._counts(categories)
+        missing, incomplete=self._issues(categories)
+        stats={
+            "total_chapters": len(aggregated.get("chapters", [])),
+            "total_items": total,
+            "items_by_type": {
+                k: sum(self.importance.get(k, {}).values()) for k in categories
+            },
+            "items_by_importance": {
+                "high": high,
+                "medium": medium,
+                "low": sum(self.importance.get(k, {}).get("low", 0) for k in categories)
+            }
+        }
+        return {
+            "compression_policy": self.ex._compression_policy(),
+            "information_loss": self.ex._loss_report(total, high, medium, low),
+            "traceability": self.ex._traceability_report(total, missing, incomplete),
+            "statistics": stats
+        }
+
+    def _counts(self, categories):
+        total=high=medium=0
+        for k in categories:
+            counts=self.importance.get(k, {})
+            total+=sum(counts.values())
+            high+=counts.get("high", 0)
+            medium+=counts.get("medium", 0)
+        #Loss estimation counts any other label as low
+        return total, high, medium, total-high-medium
+
+    def _issues(self, categories):
+        #Same order as walking document_summary: category, then chapter
+        missing=[]
+        incomplete=[]
+        for k in categories:
+            by_chapter=self.issues.get(k, {})
+            for chapter_id in sorted(by_chapter, key=self.chapter_order.get):
+                missing.extend(by_chapter[chapter_id][0])
+                incomplete.extend(by_chapter[chapter_id][1])
+        return missing, incomplete
@@ -0,0 +1,52 @@
+#Pipeline stages that can be hooked, in order
+STAGES = ("process_section", "classify_sentences", "summarize_section", "aggregate_document", "generate_report")
+
+class PipelineHooks:
+    """
+    Callbacks run around the pipeline stages of process_document, without
+    touching the stage code:
+        hooks = PipelineHooks()
+        hooks.before("classify_sentences", lambda processed: ...)
+        hooks.after("summarize_section", lambda classified, summarized: ...)
+        process_document(doc_structure, hooks=hooks)
+    A before callback gets the stage's input, an after callback its input
+    and its result:
+        process_section      section dict        -> processed section
+        classify_sentences   processed section   -> classified section
+        summarize_section    classified section  -> summarized section
+        aggregate_document   summarized sections -> aggregated output
+        generate_report      aggregated output   -> explainability report
+    The first three run once per section; sections taken from a cache,
+    journal or previous revision skip them. With batch_size or n_process,
+    before("process_section") runs as the section's text enters nlp.pipe
+    and after("process_section") as its result comes out. A stage that
+    fails gets no after call. An exception raised by a classify_sentences
+    or summarize_section callback fails the section like an error of the
+    stage itself; the others propagate.
+    """
+    def __init__(self):
+        self._before = {stage: [] for stage in STAGES}
+        self._after = {stage: [] for stage in STAGES}
+
+    #Registration
+    def before(self, stage, callback):
+        self._callbacks(self._before, stage).append(callback)
+        return callback
+
+    def after(self, stage, callback):
+        self._callbacks(self._after, stage).append(callback)
+        return callback
+
+    #Dispatch, called by the pipeline
+    def run_before(self, stage, payload):
+        for callback in self._before[stage]:
+            callback(payload)
+
+    def run_after(self, stage, payload, result):
+        for callback in self._after[stage]:
+            callback(payload, result)
+
+    def _callbacks(self, table, stage):
+        if stage not in table:
+            raise ValueError(f"Unknown stage: {stage}; expected one of {', '.join(STAGES)}")
+        return table[stage]
@@ -1,10 +1,32 @@
 import json
+import sqlite3
+import sys
 from pathlib import Path
-from pdf_reader import structurize
+from pdf_reader import stream_document
 from pipeline import process_document
+from records import json_default
+from output_writer import JsonStreamWriter, NdjsonWriter
+from output_store import write_sqlite
+from search_index import SearchIndex
 
-def main():
+# Output formats: indented JSON, JSON without whitespace, one note per line,
+# SQLite database for output_store.OutputStore
+OUTPUT_FORMATS = {
+    "json": "output.json",
+    "compact": "output.json",
+    "ndjson": "output.ndjson",
+    "sqlite": "output.sqlite"
+}
+# Full-text index over the retained notes, written only on request
+SEARCH_INDEX_PATH = "output.index.json"
+
+def main(output_format="json", build_index=False):
     try:
+        if output_format not in OUTPUT_FORMATS:
+            print(f"Error: Unknown output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}.")
+            return
+        
+
         # Get file path from user
         file_path = input("Enter the File Path: ").strip()
         
@@ -12,29 +34,46 @@ def main():
             print("Error: No file path provided.")
             return
         
-        # Step 1: Structure the PDF
+        # Step 1: Open the PDF as a stream of sections
         print(f"Processing PDF: {file_path}")
-        doc_structure = structurize(file_path)
+        doc_structure = stream_document(file_path)
         
         if doc_structure is None:
             print("Failed to process PDF. Exiting.")
             return
         
-        # Check if we have any content
-        if not doc_structure.get("chapters"):
-            print("Warning: No chapters or content found in the PDF.")
-        
-        # Step 2: Process through pipeline
+        # Step 2: Process through pipeline while the PDF is being read
         print("Running document through compression pipeline...")
+        output_path = OUTPUT_FORMATS[output_format]
         try:
-            result = process_document(doc_structure)
+            if output_format == "ndjson":
+                # Notes are written out as each section is summarized
+                with open(output_path, "w", encoding="utf-8") as f:
+                    writer = NdjsonWriter(f)
+                    writer.write_header(doc_structure.get("doc_id"), doc_structure.get("metadata", {}))
+                    result = process_document(doc_structure, compact=True, on_section=writer.write_section)
+                    writer.write_footer(result)
+            else:
+                result = process_document(doc_structure, compact=True)
+            
+            # Check if we have any content
+            if not result.get("analysis", {}).get("chapters"):
+                print("Warning: No chapters or content found in the PDF.")
             
             # Step 3: Save output
-            output_path = "output.json"
             try:
-                with open(output_path, "w", encoding="utf-8") as f:
-                    json.dump(result, f, indent=2, ensure_ascii=False)
+                if output_format == "sqlite":
+                    write_sqlite(result, output_path)
+                elif output_format != "ndjson":
+                    with open(output_path, "w", encoding="utf-8") as f:
+                        JsonStreamWriter(f, indent=None if output_format == "compact" else 2).write(result)
                 print(f"Success! Compressed output saved to: {output_path}")
+                if build_index:
+                    # Indexed from the final notes of the saved output
+                    search_index = SearchIndex()
+                    search_index.add_output(result)
+                    search_index.save(SEARCH_INDEX_PATH)
+                    print(f"Search index saved to: {SEARCH_INDEX_PATH}")
                 
                 # Print summary statistics
                 if result.get("analysis", {}).get("document_summary"):
@@ -49,11 +88,11 @@ def main():
                         print(f"\nTotal chapters: {stats.get('total_chapters', 0)}")
                         print(f"Total items retained: {stats.get('total_items', 0)}")
                         
-            except (IOError, PermissionError) as e:
+            except (IOError, PermissionError, sqlite3.Error) as e:
                 print(f"Error saving output file: {str(e)}")
                 # Print result to console if file save fails
                 print("\n=== Compressed Output ===")
-                print(json.dumps(result, indent=2)[:1000] + "...")
+                print(json.dumps(result, indent=2, default=json_default)[:1000] + "...")
                 
         except Exception as pipeline_error:
             print(f"Error in pipeline processing: {str(pipeline_error)}")
@@ -68,4 +107,5 @@ def main():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = [a for a in sys.argv[1:] if a != "--index"]
+    main(args[0] if args else "json", build_index="--index" in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,264 @@
+import json
+import os
+import time
+import tracemalloc
+
+STAGES = ("sentence_processing", "classification", "summarization", "aggregation", "explainability")
+#Where a section's summary came from
+ORIGINS = ("processed", "previous", "journal", "cache", "failed")
+
+class PipelineMetrics:
+    """
+    Timings, counters and memory of one process_document run, for sizing
+    workers and finding pathological sections. Pass one as
+    process_document(..., metrics=PipelineMetrics()) and the output gets a
+    "metrics" block:
+    {
+        "totals": {
+            "seconds": {"input": ..., "sentence_processing": ..., ...,
+                        "explainability": ..., "total": ...},
+            "sections": {"processed": 120, "cache": 3, ...},
+            "sentences": ..., "notes": ..., "chars": ...,
+            "nlp_calls": ..., "entity_memo_hits": ...,
+            "sentences_per_sec": ..., "peak_memory_bytes": ...
+        },
+        "sections": [
+            {"chapter_id": "...", "section_id": "...", "origin": "processed",
+             "chars": ..., "sentences": ..., "notes": ..., "nlp_calls": ...,
+             "entity_memo_hits": ..., "seconds": {...}, "peak_memory_bytes": ...}
+        ]
+    }
+    "input" is the time spent reading sections from doc_structure (e.g.
+    parsing the PDF when it is a pdf_reader stream). Sections taken from
+    the previous revision, the journal or the cache have no stage times.
+    With batch_size or n_process, documents come out of nlp.pipe a batch
+    at a time, so the section that completes a batch carries its Step1
+    time; the totals are exact either way.
+    trace_memory: record tracemalloc peaks, per section and overall.
+    Tracing slows the run down noticeably, so it is off by default
+    per_section: keep the "sections" list; the totals are always kept
+    sinks: objects with write_section(doc_id, entry) and
+    write_document(doc_id, totals), e.g. JsonLinesSink or
+    PrometheusTextfileSink
+    """
+    def __init__(self, trace_memory=False, per_section=True, sinks=None):
+        self.trace_memory = trace_memory
+        self.per_section = per_section
+        self.sinks = list(sinks or [])
+        self.doc_id = None
+        self.sections = []
+        self.seconds = dict.fromkeys(("input",) + STAGES, 0.0)
+        self.origins = dict.fromkeys(ORIGINS, 0)
+        self.counts = {"sentences": 0, "notes": 0, "chars": 0, "nlp_calls": 0, "entity_memo_hits": 0}
+        self.peak = 0
+        self.last_processing = None
+        self._started = None
+        self._own_tracing = False
+
+    #Collection, called by the pipeline
+    def start(self, doc_id):
+        self.doc_id = doc_id
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+
+    def reading(self, sections):
+        """
+        Wraps the section source, timing how long each read takes.
+        """
+        sections = iter(sections)
+        while True:
+            started = time.perf_counter()
+            try:
+                section = next(sections)
+            except StopIteration:
+                return
+            finally:
+                self.seconds["input"] += time.perf_counter() - started
+            yield section
+
+    def processing(self, stream, sp):
+        """
+        Wraps Step1's (section, processed) stream. The Step1 time, NLP
+        calls and entity memo hits behind each pair are left in
+        last_processing when it is yielded.
+        """
+        stream = iter(stream)
+        while True:
+            self._reset_peak()
+            input_before = self.seconds["input"]
+            calls_before = sp.nlp_calls
+            hits_before = self._memo_hits(sp)
+            started = time.perf_counter()
+            try:
+                pair = next(stream)
+            except StopIteration:
+                return
+            elapsed = time.perf_counter() - started - (self.seconds["input"] - input_before)
+            self.seconds["sentence_processing"] += elapsed
+            self.last_processing = {
+                "sentence_processing": elapsed,
+                "nlp_calls": sp.nlp_calls - calls_before,
+                "entity_memo_hits": self._memo_hits(sp) - hits_before
+            }
+            yield pair
+
+    def add_section(self, section, summarized, origin, processing=None, timings=None):
+        """
+        Records one section once Steps 1-3 are done with it (or it was
+        taken from elsewhere, or failed: summarized=None).
+        """
+        processing = processing or {}
+        timings = timings or {}
+        for stage, seconds in timings.items():
+            self.seconds[stage] += seconds
+        notes = sum(len(v) for v in summarized["summary"].values()) if summarized else 0
+        seconds = {}
+        if processing.get("sentence_processing") is not None:
+            seconds["sentence_processing"] = round(processing["sentence_processing"], 6)
+        seconds.update((stage, round(s, 6)) for stage, s in timings.items())
+        entry = {
+            "chapter_id": section.get("chapter_id"),
+            "section_id": section.get("section_id"),
+            "origin": origin,
+            "chars": len(section.get("raw_text") or ""),
+            #Every sentence becomes a note
+            "sentences": notes,
+            "notes": notes,
+            "nlp_calls": processing.get("nlp_calls", 0),
+            "entity_memo_hits": processing.get("entity_memo_hits", 0),
+            "seconds": seconds
+        }
+        if self.trace_memory and origin == "processed":
+            #Peak since this section's Step1 started
+            entry["peak_memory_bytes"] = self._peak()
+        self.origins[origin] += 1
+        for key in self.counts:
+            self.counts[key] += entry[key]
+        if self.per_section:
+            self.sections.append(entry)
+        for sink in self.sinks:
+            sink.write_section(self.doc_id, entry)
+
+    def add_stage(self, stage, seconds):
+        self.seconds[stage] += seconds
+
+    def finish(self):
+        """
+        Closes the run; returns the "metrics" block and hands the totals
+        to the sinks.
+        """
+        total = time.perf_counter() - self._started
+        seconds = {k: round(v, 6) for k, v in self.seconds.items()}
+        seconds["total"] = round(total, 6)
+        totals = {
+            "seconds": seconds,
+            "sections": dict(self.origins),
+            **self.counts,
+            "sentences_per_sec": round(self.counts["sentences"] / total, 1) if total > 0 else None
+        }
+        if self.trace_memory:
+            self._peak()
+            totals["peak_memory_bytes"] = self.peak
+            if self._own_tracing:
+                tracemalloc.stop()
+                self._own_tracing = False
+        for sink in self.sinks:
+            sink.write_document(self.doc_id, totals)
+        block = {"totals": totals}
+        if self.per_section:
+            block["sections"] = self.sections
+        return block
+
+    #Helper functions
+    def _memo_hits(self, sp):
+        return sp.entity_memo.hits if sp.entity_memo is not None else 0
+
+    def _peak(self):
+        """
+        Peak traced memory since the last _reset_peak.
+        """
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        self.peak = max(self.peak, peak)
+        return peak
+
+    def _reset_peak(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._peak()
+            tracemalloc.reset_peak()
+
+class JsonLinesSink:
+    """
+    Appends one JSON line per section as it completes and one per
+    document at the end:
+    {"record": "section", "doc_id": "...", "section_id": "...", ...}
+    {"record": "document", "doc_id": "...", "seconds": {...}, ...}
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_section(self, doc_id, entry):
+        self._write(dict({"record": "section", "doc_id": doc_id}, **entry))
+
+    def write_document(self, doc_id, totals):
+        self._write(dict({"record": "document", "doc_id": doc_id, "time": time.time()}, **totals))
+
+    def close(self):
+        self._file.close()
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+class PrometheusTextfileSink:
+    """
+    Writes the totals of each document in the Prometheus text format, for
+    node_exporter's textfile collector. The file is replaced atomically
+    and holds the most recent document only, so give each worker process
+    its own path (e.g. compression_<pid>.prom).
+    """
+    def __init__(self, path, prefix="compression"):
+        self.path = path
+        self.prefix = prefix
+
+    def write_section(self, doc_id, entry):
+        pass
+
+    def write_document(self, doc_id, totals):
+        labels = {"doc_id": doc_id}
+        lines = []
+        def gauge(name, help_text, samples):
+            name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for extra, value in samples:
+                lines.append(f"{name}{self._labels(dict(labels, **extra))} {value}")
+        gauge("stage_seconds", "Wall time per pipeline stage of the last document.",
+              [({"stage": stage}, seconds) for stage, seconds in totals["seconds"].items()])
+        gauge("sections", "Sections of the last document by where their summary came from.",
+              [({"origin": origin}, n) for origin, n in totals["sections"].items()])
+        for key, help_text in [
+            ("sentences", "Sentences of the last document."),
+            ("notes", "Notes of the last document."),
+            ("chars", "Characters of raw text in the last document."),
+            ("nlp_calls", "Texts run through the NLP pipeline for the last document."),
+            ("entity_memo_hits", "Sentences of the last document served by the entity memo."),
+            ("sentences_per_sec", "Sentences per second over the whole last document."),
+            ("peak_memory_bytes", "tracemalloc peak while processing the last document.")
+        ]:
+            if totals.get(key) is not None:
+                gauge(key, help_text, [({}, totals[key])])
+        gauge("last_run_timestamp_seconds", "When the last document finished.", [({}, round(time.time(), 3))])
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _labels(self, labels):
+        escaped = [
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+            for k, v in labels.items()
+        ]
+        return "{" + ",".join(escaped) + "}"
@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+from records import Note, ENTITY_KEYS, json_default
+from aggregator import resolve_notes
+
+#Note keys that get their own columns; anything else goes to "extra"
+_NOTE_KEYS = ("statement", "type", "importance", "entities", "source")
+_SOURCE_KEYS = ("chapter_id", "section_id", "page_start", "page_end", "char_offset", "line")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE chapters (
+    chapter_idx INTEGER PRIMARY KEY, chapter_id TEXT,
+    sections_included TEXT, page_range TEXT, categories TEXT
+);
+CREATE TABLE notes (
+    note_id INTEGER PRIMARY KEY, chapter_idx INTEGER, category TEXT, position INTEGER,
+    statement TEXT, type TEXT, importance TEXT,
+    chapter_id TEXT, section_id TEXT, page_start INTEGER, page_end INTEGER,
+    char_offset INTEGER, line INTEGER, extra TEXT
+);
+CREATE INDEX notes_chapter ON notes (chapter_idx, category, position);
+CREATE INDEX notes_section ON notes (section_id);
+CREATE TABLE entities (note_id INTEGER, kind TEXT, position INTEGER, value TEXT);
+CREATE INDEX entities_note ON entities (note_id);
+CREATE INDEX entities_value ON entities (kind, value);
+CREATE TABLE summary (
+    category TEXT, position INTEGER, note_id INTEGER, ref TEXT,
+    PRIMARY KEY (category, position)
+);
+"""
+
+def _note_dict(note):
+    return note.to_dict() if isinstance(note, Note) else note
+
+def write_sqlite(result, path):
+    """
+    Writes a process_document result to a single SQLite file at path
+    (replacing it). Notes, their entities and sources are stored as rows;
+    document_summary is stored as positions pointing at those rows, so
+    OutputStore can read one note or one category without loading the
+    rest.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(_SCHEMA)
+        analysis = result.get("analysis", {})
+        meta = {k: v for k, v in result.items() if k != "analysis"}
+        meta["analysis"] = {
+            k: v for k, v in analysis.items() if k not in ("chapters", "document_summary")
+        }
+        meta["keys"] = list(result.keys())
+        meta["categories"] = list(analysis.get("document_summary", {}).keys())
+        db.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False, default=json_default)) for k, v in meta.items()]
+        )
+        writer = _NoteWriter(db)
+        chapter_notes = []
+        for chapter_idx, chapter in enumerate(analysis.get("chapters", [])):
+            db.execute(
+                "INSERT INTO chapters VALUES (?, ?, ?, ?, ?)",
+                (chapter_idx, chapter.get("chapter_id"),
+                 json.dumps(chapter.get("sections_included")),
+                 json.dumps(chapter.get("page_range")),
+                 json.dumps(list(chapter.get("aggregated", {}).keys())))
+            )
+            ids = {}
+            for category, notes in chapter.get("aggregated", {}).items():
+                ids[category] = [
+                    writer.add(note, chapter_idx, category, position)
+                    for position, note in enumerate(notes)
+                ]
+            chapter_notes.append(ids)
+        #Document summary: references into the note rows written above
+        reference = analysis.get("summary_format") == "reference"
+        rows = []
+        for category, items in analysis.get("document_summary", {}).items():
+            notes = resolve_notes(analysis, category)
+            for position, (item, note) in enumerate(zip(items, notes)):
+                if reference and len(item) == 2:
+                    note_id = chapter_notes[item[0]][category][item[1]]
+                else:
+                    #Inline notes, and merged duplicates with their sources
+                    note_id = writer.find(note)
+                    if note_id is None:
+                        note_id = writer.add(note, None, category, position)
+                rows.append((category, position, note_id, json.dumps(item) if reference else None))
+        db.executemany("INSERT INTO summary VALUES (?, ?, ?, ?)", rows)
+        db.commit()
+    finally:
+        db.close()
+
+class _NoteWriter:
+    def __init__(self, db):
+        self.db = db
+        self.next_id = 0
+        self.by_object = {}
+        self._by_content = None
+
+    def add(self, note, chapter_idx, category, position):
+        note_id = self.next_id
+        self.next_id += 1
+        self.by_object[id(note)] = (note_id, note)
+        if self._by_content is not None:
+            self._by_content.setdefault(self._content(note), note_id)
+        note = _note_dict(note)
+        source = note.get("source")
+        extra = {k: v for k, v in note.items() if k not in _NOTE_KEYS}
+        if not isinstance(source, dict) or any(k not in _SOURCE_KEYS for k in source):
+            #Kept verbatim when it does not fit the source columns
+            extra["source"] = source
+            source = {}
+        self.db.execute(
+            "INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (note_id, chapter_idx, category, position,
+             note.get("statement"), note.get("type"), note.get("importance"),
+             source.get("chapter_id"), source.get("section_id"),
+             source.get("page_start"), source.get("page_end"),
+             source.get("char_offset"), source.get("line"),
+             json.dumps(extra, ensure_ascii=False, default=json_default) if extra else None)
+        )
+        self.db.executemany(
+            "INSERT INTO entities VALUES (?, ?, ?, ?)",
+            [(note_id, kind, n, value)
+             for kind, values in (note.get("entities") or {}).items()
+             for n, value in enumerate(values)]
+        )
+        return note_id
+
+    def find(self, note):
+        """
+        Row of a note already written: the same object, or (for a result
+        read back from JSON) an equal note.
+        """
+        known = self.by_object.get(id(note))
+        if known is not None and known[1] is note:
+            return known[0]
+        if self._by_content is None:
+            self._by_content = {}
+            for note_id, written in self.by_object.values():
+                self._by_content.setdefault(self._content(written), note_id)
+        return self._by_content.get(self._content(note))
+
+    def _content(self, note):
+        return json.dumps(note, sort_keys=True, default=json_default)
+
+class OutputStore:
+    """
+    Read side of write_sqlite. Opening is lazy and every lookup is a small
+    indexed query, so a single drill-down on a large output reads a handful
+    of rows instead of parsing the whole file.
+    pipeline.get_drill_down accepts an OutputStore in place of the output
+    dict.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._meta = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"File not found: {self.path}")
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return self._db
+
+    #Metadata
+    def meta(self, key, default=None):
+        if self._meta is None:
+            self._meta = {
+                k: json.loads(v) for k, v in self.db.execute("SELECT key, value FROM meta")
+            }
+        return self._meta.get(key, default)
+
+    def categories(self):
+        """
+        Number of document_summary notes per category.
+        """
+        counts = dict(self.db.execute(
+            "SELECT category, COUNT(*) FROM summary GROUP BY category"
+        ).fetchall())
+        return {k: counts.get(k, 0) for k in self.meta("categories", [])}
+
+    def chapters(self):
+        """
+        Chapter entries without their notes.
+        """
+        return [
+            {"chapter_id": chapter_id,
+             "sections_included": json.loads(sections),
+             "page_range": json.loads(page_range)}
+            for chapter_id, sections, page_range in self.db.execute(
+                "SELECT chapter_id, sections_included, page_range FROM chapters ORDER BY chapter_idx"
+            )
+        ]
+
+    #Notes
+    def get_note(self, category, index):
+        """
+        One document_summary note by position, or None if out of range.
+        """
+        if index < 0:
+            return None
+        notes = self._notes(
+            "SELECT n.* FROM summary s JOIN notes n ON n.note_id = s.note_id "
+            "WHERE s.category = ? AND s.position = ?", (category, index)
+        )
+        return notes[0] if notes else None
+
+    def list_category(self, category, offset=0, limit=None):
+        """
+        document_summary notes of one category, in order, optionally paged.
+        """
+        return self._notes(
+            "SELECT n.* FROM summary s JOIN notes n ON n.note_id = s.note_id "
+            "WHERE s.category = ? ORDER BY s.position LIMIT ? OFFSET ?",
+            (category, -1 if limit is None else limit, offset)
+        )
+
+    def chapter_notes(self, chapter_idx, category):
+        return self._notes(
+            "SELECT * FROM notes WHERE chapter_idx = ? AND category = ? ORDER BY position",
+            (chapter_idx, category)
+        )
+
+    def section_notes(self, section_id):
+        return self._notes(
+            "SELECT * FROM notes WHERE section_id = ? ORDER BY note_id", (section_id,)
+        )
+
+    #Full load
+    def load(self):
+        """
+        The whole process_document result, as write_sqlite was given it.
+        """
+        analysis = {"chapters": []}
+        chapter_categories = self.db.execute(
+            "SELECT categories FROM chapters ORDER BY chapter_idx"
+        ).fetchall()
+        for chapter_idx, chapter in enumerate(self.chapters()):
+            rows = self._notes(
+                "SELECT * FROM notes WHERE chapter_idx = ? ORDER BY note_id",
+                (chapter_idx,), with_category=True
+            )
+            aggregated = {k: [] for k in json.loads(chapter_categories[chapter_idx][0])}
+            for category, note in rows:
+                aggregated[category].append(note)
+            chapter["aggregated"] = aggregated
+            analysis["chapters"].append(chapter)
+        reference = self.meta("analysis", {}).get("summary_format") == "reference"
+        summary = {}
+        for category in self.meta("categories", []):
+            if reference:
+                summary[category] = [
+                    json.loads(ref) for ref, in self.db.execute(
+                        "SELECT ref FROM summary WHERE category = ? ORDER BY position",
+                        (category,)
+                    )
+                ]
+            else:
+                summary[category] = self.list_category(category)
+        analysis["document_summary"] = summary
+        analysis.update(self.meta("analysis", {}))
+        result = {}
+        for key in self.meta("keys", []):
+            result[key] = analysis if key == "analysis" else self.meta(key)
+        return result
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _notes(self, query, params, with_category=False):
+        rows = self.db.execute(query, params).fetchall()
+        if not rows:
+            return []
+        entities = {}
+        ids = [row[0] for row in rows]
+        #Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for note_id, kind, value in self.db.execute(
+                f"SELECT note_id, kind, value FROM entities WHERE note_id IN ({placeholders}) "
+                "ORDER BY note_id, kind, position", chunk
+            ):
+                entities.setdefault(note_id, {}).setdefault(kind, []).append(value)
+        notes = []
+        for row in rows:
+            note = self._note(row, entities.get(row[0], {}))
+            notes.append((row[2], note) if with_category else note)
+        return notes
+
+    def _note(self, row, entities):
+        (note_id, _, _, _, statement, note_type, importance,
+         chapter_id, section_id, page_start, page_end, char_offset, line, extra) = row
+        extra = json.loads(extra) if extra else {}
+        if "source" in extra:
+            source = extra.pop("source")
+        else:
+            source = {
+                "chapter_id": chapter_id,
+                "section_id": section_id,
+                "page_start": page_start,
+                "page_end": page_end,
+                "char_offset": char_offset
+            }
+            if line is not None:
+                source["line"] = line
+        note = {
+            "statement": statement,
+            "type": note_type,
+            "importance": importance,
+            "entities": {k: entities.get(k, []) for k in ENTITY_KEYS},
+            "source": source
+        }
+        note.update(extra)
+        return note
@@ -0,0 +1,119 @@
+import json
+from records import Note, json_default
+
+class JsonStreamWriter:
+    """
+    Writes a process_document result to an open text file piece by piece:
+    the header, then one chapter at a time, then one document summary
+    category at a time, flushing after each so a reader can follow along.
+    The file is the same as json.dump(result, f, indent=indent) would give;
+    indent=None writes it compact, as with separators=(",", ":").
+    """
+    def __init__(self, f, indent=2):
+        self.f = f
+        self.indent = indent
+
+    def write(self, result):
+        self.f.write("{")
+        for n, (key, value) in enumerate(result.items()):
+            self._key(key, 1, n == 0)
+            if key == "analysis" and isinstance(value, dict):
+                self._write_analysis(value)
+            else:
+                self.f.write(self._dumps(value, 1))
+            self.f.flush()
+        self._close(0, bool(result))
+        self.f.flush()
+
+    def _write_analysis(self, analysis):
+        self.f.write("{")
+        for n, (key, value) in enumerate(analysis.items()):
+            self._key(key, 2, n == 0)
+            if key == "chapters" and isinstance(value, list):
+                self._write_list(value, 2)
+            elif key == "document_summary" and isinstance(value, dict):
+                self.f.write("{")
+                for m, (category, notes) in enumerate(value.items()):
+                    self._key(category, 3, m == 0)
+                    self._write_list(notes, 3)
+                    self.f.flush()
+                self._close(2, bool(value))
+            else:
+                self.f.write(self._dumps(value, 2))
+        self._close(1, bool(analysis))
+
+    def _write_list(self, items, depth):
+        if not items:
+            self.f.write("[]")
+            return
+        self.f.write("[")
+        for n, item in enumerate(items):
+            if n:
+                self.f.write(",")
+            self.f.write(self._newline(depth + 1))
+            self.f.write(self._dumps(item, depth + 1))
+            if depth == 2:
+                #One chapter is out
+                self.f.flush()
+        self.f.write(self._newline(depth) + "]")
+
+    #Layout, matching json.dump
+    def _dumps(self, value, depth):
+        if self.indent is None:
+            return json.dumps(value, ensure_ascii=False, default=json_default, separators=(",", ":"))
+        text = json.dumps(value, ensure_ascii=False, default=json_default, indent=self.indent)
+        return text.replace("\n", self._newline(depth))
+
+    def _newline(self, depth):
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * depth)
+
+    def _key(self, key, depth, first):
+        if not first:
+            self.f.write(",")
+        self.f.write(self._newline(depth))
+        self.f.write(json.dumps(key, ensure_ascii=False))
+        self.f.write(":" if self.indent is None else ": ")
+
+    def _close(self, depth, non_empty):
+        if non_empty:
+            self.f.write(self._newline(depth))
+        self.f.write("}")
+
+class NdjsonWriter:
+    """
+    Writes the compressed output as newline-delimited JSON, one record per
+    line:
+    {"record": "document", "doc_id": "...", "metadata": {...}}
+    {"record": "note", "category": "rules", "statement": "...", "type": "...",
+     "importance": "...", "entities": {...}, "source": {...}}
+    ...
+    {"record": "explainability", "explainability": {...}}
+    Notes are written as each section is summarized (pass write_section as
+    process_document's on_section), so the file grows while the document
+    is still being processed.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.notes = 0
+
+    def write_header(self, doc_id, metadata):
+        self._record({"record": "document", "doc_id": doc_id, "metadata": metadata})
+
+    def write_section(self, summarized):
+        for category, notes in summarized.get("summary", {}).items():
+            for note in notes:
+                if isinstance(note, Note):
+                    note = note.to_dict()
+                self._record(dict({"record": "note", "category": category}, **note))
+                self.notes += 1
+        self.f.flush()
+
+    def write_footer(self, result):
+        self._record({"record": "explainability", "explainability": result.get("explainability", {})})
+        self.f.flush()
+
+    def _record(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False, default=json_default, separators=(",", ":")))
+        self.f.write("\n")
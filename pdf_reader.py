@@ -1,19 +1,302 @@
 import pdfplumber as pp
 import re
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing.util import Finalize
 from pathlib import Path
 
-def structurize(file_path):
+def is_chapter_name(line):
     try:
-        # Check if file exists
-        if not Path(file_path).exists():
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        # Check if it's a PDF file
-        if not file_path.lower().endswith('.pdf'):
-            raise ValueError("Input file must be a PDF document")
-        
-        pdf = pp.open(file_path)
+        return re.match(r"^(CHAPTER|ARTICLE|PART|SUBPART)\s*(\d+)((?:\s+.*))?$", line, re.IGNORECASE)
+    except re.error:
+        return None
+
+def create_chapter(m, pg):
+    try:
+        return {
+            "chapter_id" : m.group(1),
+            "chapter_title" : m.group(2).strip(),
+            "page_start" : pg,
+            "page_end" : None,
+            "chapter_text" : "",
+            "sections" : []
+        }
+    except (IndexError, AttributeError) as e:
+        print(f"Warning: Error creating chapter: {str(e)}")
+        return None
+
+def close_curr_chap(pg, curr_chap, buf=None):
+    try:
+        curr_chap["page_end"] = pg
+        if buf is not None:
+            curr_chap["chapter_text"] = buf.text()
+    except (KeyError, TypeError):
+        pass
+    return
+
+def is_section_name(line):
+    try:
+        return re.match(r"^(\d+(?:\.\d)+)\s+(.*)$", line)
+    except re.error:
+        return None
+
+def create_section(m, pg, curr_chap):
+    try:
+        if curr_chap is None:
+            print("Warning: Cannot create section without a chapter")
+            return None
+        return {
+            "section_id" : m.group(1),
+            "section_title" : m.group(2).strip(),
+            "page_start" : pg,
+            "page_end" : None,
+            "raw_text" : ""
+        }
+    except (IndexError, AttributeError) as e:
+        print(f"Warning: Error creating section: {str(e)}")
+        return None
+
+def close_curr_section(pg, curr_sec, buf=None):
+    try:
+        curr_sec["page_end"] = pg
+        if buf is not None:
+            curr_sec["raw_text"] = buf.text()
+            curr_sec["offset_index"] = buf.index
+    except (KeyError, TypeError):
+        pass
+    return
+
+class _TextBuffer:
+    """
+    Collects the lines of one chapter or section without repeated string
+    copies, and records an offset index for them: one
+    [char_offset, page_number, line_number] entry wherever a run of
+    consecutive lines from the same page starts. line_number is 1-based
+    within the page.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.index = []
+        self._next = None
+
+    def add(self, line, page_number, line_number):
+        if self._next != (page_number, line_number):
+            self.index.append([self.size, page_number, line_number])
+        self._next = (page_number, line_number + 1)
+        self.chunks.append(line + "\n")
+        self.size += len(line) + 1
+
+    def text(self):
+        return "".join(self.chunks)
+
+def _page_texts(pdf, start=0, end=None):
+    """
+    Yields (page_number, text) for pages[start:end]; text is None when the
+    page has no text or could not be extracted.
+    """
+    for page in pdf.pages[start:end]:
+        try:
+            text = page.extract_text()
+        except Exception as page_error:
+            print(f"Warning: Error processing page: {str(page_error)}")
+            text = None
+        #Drop pdfplumber's per-page layout cache once the text is out
+        page.flush_cache()
+        yield page.page_number, text
+
+#pdfplumber handles opened by this process when it is an extraction worker
+_worker_pdfs = {}
+
+def _init_extract_worker():
+    #Runs when the worker process exits, including on pool shutdown
+    Finalize(None, _close_worker_pdfs, exitpriority=10)
+
+def _close_worker_pdfs():
+    while _worker_pdfs:
+        _, pdf = _worker_pdfs.popitem()
+        try:
+            pdf.close()
+        except Exception as close_error:
+            print(f"Warning: Error closing PDF: {str(close_error)}")
+
+def _extract_page_range(file_path, start, end):
+    """
+    Worker side of _parallel_page_texts: returns [(page_number, text)] for
+    pages[start:end], using a pdfplumber handle owned by this process.
+    """
+    pdf = _worker_pdfs.get(file_path)
+    if pdf is None:
+        pdf = _worker_pdfs[file_path] = pp.open(file_path)
+    return list(_page_texts(pdf, start, end))
+
+def _parallel_page_texts(file_path, page_count, workers, pages_per_task):
+    """
+    Same (page_number, text) stream as _page_texts, with page ranges
+    extracted across a pool of worker processes. Ranges are handed back in
+    page order and only a few are in flight at a time, so memory stays
+    bounded and the state machine sees exactly the serial sequence.
+    """
+    ranges = iter([
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker) as pool:
+        in_flight = deque()
+        try:
+            for start, end in islice(ranges, workers * 2):
+                in_flight.append(pool.submit(_extract_page_range, file_path, start, end))
+            while in_flight:
+                texts = in_flight.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    in_flight.append(pool.submit(_extract_page_range, file_path, *next_range))
+                yield from texts
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+def _page_source(pdf, file_path, workers, pages_per_task):
+    if workers > 1:
+        return _parallel_page_texts(file_path, len(pdf.pages), workers, pages_per_task)
+    return _page_texts(pdf)
+
+def _walk_pages(page_texts):
+    """
+    Runs the chapter/section state machine over (page_number, text) pairs.
+    Yields ("chapter", chapter) when a chapter heading is seen and
+    ("section", chapter, section) once a section is closed by the next
+    heading or the end of the document.
+    """
+    current_chapter = None
+    current_section = None
+    chapter_buf = None
+    section_buf = None
+    last_page = None
+    for page_number, text in page_texts:
+        last_page = page_number
+        try:
+            if text is None:
+                continue
+            lines = text.splitlines()
+            for idx, line in enumerate(lines):
+                try:
+                    line = line.strip()
+                    m = is_chapter_name(line)
+                    if m:
+                        if current_chapter is not None:
+                            if idx == 0:
+                                if current_section is not None:
+                                    close_curr_section(page_number - 1, current_section, section_buf)
+                                    yield "section", current_chapter, current_section
+                                    current_section = None
+                                close_curr_chap(page_number - 1, current_chapter, chapter_buf)
+
+                            else:
+                                if current_section is not None:
+                                    close_curr_section(page_number, current_section, section_buf)
+                                    yield "section", current_chapter, current_section
+                                    current_section = None
+                                close_curr_chap(page_number, current_chapter, chapter_buf)
+
+                        current_chapter = create_chapter(m, page_number)
+                        chapter_buf = _TextBuffer()
+                        if current_chapter is not None:
+                            yield "chapter", current_chapter
+                        continue
+                    m = is_section_name(line)
+                    if m:
+                        if current_section is not None:
+                            if idx == 0:
+                                close_curr_section(page_number - 1, current_section, section_buf)
+                            else:
+                                close_curr_section(page_number, current_section, section_buf)
+                            yield "section", current_chapter, current_section
+                        current_section = create_section(m, page_number, current_chapter)
+                        section_buf = _TextBuffer()
+                        continue
+                    if current_chapter is not None and current_section is None:
+                        chapter_buf.add(line, page_number, idx + 1)
+                    if current_section is not None:
+                        section_buf.add(line, page_number, idx + 1)
+                except Exception as line_error:
+                    print(f"Warning: Error processing line: {str(line_error)}")
+                    continue
+        except Exception as page_error:
+            print(f"Warning: Error processing page: {str(page_error)}")
+            continue
+
+    if current_chapter is not None:
+        if current_section is not None:
+            close_curr_section(last_page, current_section, section_buf)
+            yield "section", current_chapter, current_section
+        close_curr_chap(last_page, current_chapter, chapter_buf)
+
+def _open_pdf(file_path):
+    # Check if file exists
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    # Check if it's a PDF file
+    if not file_path.lower().endswith('.pdf'):
+        raise ValueError("Input file must be a PDF document")
+
+    return pp.open(file_path)
+
+def _stream_sections(pdf, page_texts):
+    try:
+        for event in _walk_pages(page_texts):
+            if event[0] != "section":
+                continue
+            _, chapter, section = event
+            section["chapter_id"] = chapter["chapter_id"]
+            section["chapter_title"] = chapter["chapter_title"]
+            yield section
+    finally:
+        pdf.close()
+
+def stream_document(file_path, workers=1, pages_per_task=25):
+    """
+    Streaming counterpart of structurize. Returns
+    {
+        "doc_id": "...",
+        "metadata": {...},
+        "sections": <generator of sections>
+    }
+    where each section is yielded as soon as its closing heading is seen,
+    tagged with its "chapter_id" and "chapter_title". Only the section being
+    read is held in memory. pipeline.process_document accepts this dict
+    directly. Returns None if the PDF cannot be opened.
+    workers > 1 extracts page text in that many processes, pages_per_task
+    pages at a time; the resulting structure is the same as with one.
+    """
+    try:
+        pdf = _open_pdf(file_path)
+    except FileNotFoundError as e:
+        print(f"Error: {str(e)}")
+        return
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return
+    except pp.PDFSyntaxError as e:
+        print(f"Error: Invalid or corrupted PDF file: {str(e)}")
+        return
+    except Exception as e:
+        print(f"Unexpected error during PDF processing: {str(e)}")
+        return
+    return {
+        "doc_id" : Path(file_path).stem,
+        "metadata" : pdf.metadata,
+        "sections" : _stream_sections(
+            pdf, _page_source(pdf, file_path, workers, pages_per_task)
+        )
+    }
+
+def structurize(file_path, workers=1, pages_per_task=25):
+    try:
+        pdf = _open_pdf(file_path)
 
         doc_struct = {
             "doc_id" : Path(file_path).stem,
@@ -21,117 +304,16 @@ def structurize(file_path):
             "chapters" : []
         }
 
-        def is_chapter_name(line):
-            try:
-                return re.match(r"^(CHAPTER|ARTICLE|PART|SUBPART)\s*(\d+)((?:\s+.*))?$", line, re.IGNORECASE)
-            except re.error:
-                return None
-        
-        def create_chapter(m, pg):
-            try:
-                doc_struct["chapters"].append({
-                    "chapter_id" : m.group(1),
-                    "chapter_title" : m.group(2).strip(),
-                    "page_start" : pg,
-                    "page_end" : None,
-                    "chapter_text" : "",
-                    "sections" : []
-                })
-                return doc_struct["chapters"][-1]
-            except (IndexError, AttributeError) as e:
-                print(f"Warning: Error creating chapter: {str(e)}")
-                return None
-        
-        current_chapter = None
-        current_section = None
-
-        def close_curr_chap(pg, curr_chap):
-            try:
-                curr_chap["page_end"] = pg
-            except (KeyError, TypeError):
-                pass
-            return
-        
-        def is_section_name(line):
-            try:
-                return re.match(r"^(\d+(?:\.\d)+)\s+(.*)$", line)
-            except re.error:
-                return None
-        
-        def create_section(m, pg, curr_chap):
-            try:
-                if curr_chap is None:
-                    print("Warning: Cannot create section without a chapter")
-                    return None
-                curr_chap["sections"].append({
-                    "section_id" : m.group(1),
-                    "section_title" : m.group(2).strip(),
-                    "page_start" : pg,
-                    "page_end" : None,
-                    "raw_text" : ""
-                })
-                return curr_chap["sections"][-1]
-            except (IndexError, AttributeError) as e:
-                print(f"Warning: Error creating section: {str(e)}")
-                return None
-        
-        def close_curr_section(pg, curr_sec):
-            try:
-                curr_sec["page_end"] = pg
-            except (KeyError, TypeError):
-                pass
-            return
-        
-        for page in pdf.pages:
-            try:
-                text = page.extract_text()
-                if text is None:
-                    continue
-                lines = text.splitlines()
-                for idx, line in enumerate(lines):
-                    try:
-                        line = line.strip()
-                        m = is_chapter_name(line)
-                        if m:
-                            if current_chapter is not None:
-                                if idx == 0:
-                                    if current_section is not None:
-                                        close_curr_section(page.page_number - 1, current_section)
-                                        current_section = None
-                                    close_curr_chap(page.page_number - 1, current_chapter)
-                                    
-                                else:
-                                    if current_section is not None:
-                                        close_curr_section(page.page_number, current_section)
-                                        current_section = None
-                                    close_curr_chap(page.page_number, current_chapter)
-                                    
-                            current_chapter = create_chapter(m, page.page_number)
-                            continue
-                        m = is_section_name(line)
-                        if m:
-                            if current_section is not None:
-                                if idx == 0:
-                                    close_curr_section(page.page_number - 1, current_section)
-                                else:
-                                    close_curr_section(page.page_number, current_section)
-                            current_section = create_section(m, page.page_number, current_chapter)
-                            continue
-                        if current_chapter is not None and current_section is None:
-                            current_chapter["chapter_text"] += line + "\n"
-                        if current_section is not None:
-                            current_section["raw_text"] += line + "\n"
-                    except Exception as line_error:
-                        print(f"Warning: Error processing line: {str(line_error)}")
-                        continue
-            except Exception as page_error:
-                print(f"Warning: Error processing page: {str(page_error)}")
-                continue
-                
-        if current_chapter is not None:
-            if current_section is not None:
-                close_curr_section(pdf.pages[-1].page_number, current_section)   
-            close_curr_chap(pdf.pages[-1].page_number, current_chapter)
+        try:
+            page_texts = _page_source(pdf, file_path, workers, pages_per_task)
+            for event in _walk_pages(page_texts):
+                if event[0] == "chapter":
+                    doc_struct["chapters"].append(event[1])
+                else:
+                    _, chapter, section = event
+                    chapter["sections"].append(section)
+        finally:
+            pdf.close()
 
         output_path = Path(file_path).with_suffix(".json")
 
@@ -139,11 +321,10 @@ def structurize(file_path):
             with open(output_path, "w", encoding="utf-8") as f:
                 json.dump(doc_struct, f, indent=2, ensure_ascii=False)
             print(f"Successfully saved to: {output_path}")
-            return
-        except (IOError, PermissionError, json.JSONEncodeError) as write_error:
+        except (IOError, PermissionError, TypeError, ValueError) as write_error:
             print(f"Error writing output file: {str(write_error)}")
-            return
-            
+        return doc_struct
+
     except FileNotFoundError as e:
         print(f"Error: {str(e)}")
         return
@@ -155,4 +336,4 @@ def structurize(file_path):
         return
     except Exception as e:
         print(f"Unexpected error during PDF processing: {str(e)}")
-        return
\ No newline at end of file
+        return
@@ -1,10 +1,18 @@
 from sentence_processor import SentenceProcessor
 from classifier import Classifier
 from section_summarizer import SectionSummarizer
-from aggregator import Aggregator
-from explainability import Explainability
+from aggregator import Aggregator, resolve_note
+from explainability import ReportAccumulator
+from section_cache import content_key
+from records import Note, Source
+from output_store import OutputStore
+from collections import deque
+from time import perf_counter
 
-def process_document(doc_structure):
+def process_document(doc_structure, single_pass=False, batch_size=None, n_process=1, nlp_config=None,
+                     cache=None, previous=None, entity_cache_size=10000, summary_refs=False,
+                     compact=False, on_section=None, dedup_threshold=None, budget=None,
+                     accumulator=None, checkpoint=None, nlp=None, metrics=None, hooks=None):
     """
     Input Format:
     {
@@ -32,69 +40,455 @@ def process_document(doc_structure):
             "document_summary": {...}
         },
         "explainability": {...},
-        "traceability_enabled": true
+        "traceability_enabled": true,
+        "sections": [
+            {"chapter_id": "...", "section_id": "...",
+             "content_hash": "...", "counts": {"rules": 2, ...}}
+        ]
     }
+    doc_structure may also be the section stream from
+    pdf_reader.stream_document, {"doc_id", "metadata", "sections"}, in which
+    case sections are processed as the reader yields them.
+    single_pass: parse each section once and take sentence entities from
+    the section parse instead of re-parsing every sentence
+    batch_size, n_process: when either is set, all section texts are
+    streamed through nlp.pipe with these settings instead of one nlp()
+    call per section; results keep the original section order
+    nlp_config: NLPConfig choosing the spaCy model and its components;
+    the model is loaded on first use and shared across calls
+    cache: optional SectionCache; sections whose raw text and NLP/classifier
+    setup were seen before skip Steps 1-3 and reuse the cached summary
+    previous: output of an earlier run on a previous revision; see
+    update_document
+    entity_cache_size: how many distinct sentences keep their entities
+    memoized, so repeated boilerplate skips NER; 0 disables the memo
+    summary_refs: store analysis.document_summary as [chapter_index,
+    position] references into the chapters' notes instead of repeating
+    every note (see Aggregator); get_drill_down resolves them
+    compact: carry each sentence as one slotted records.Note from Step1 to
+    the output, with sparse entities and a section reference shared by all
+    its sources, instead of rebuilding a dict per stage; write the result
+    with json.dump(..., default=records.json_default)
+    on_section: called with each summarized section, in document order, as
+    soon as Steps 1-3 are done with it (see output_writer.NdjsonWriter)
+    dedup_threshold: merge near-duplicate statements in document_summary
+    whose word shingles reach this Jaccard similarity (e.g. 0.7) and whose
+    numbers, dates, money and percentages match; the kept note lists every
+    location under "sources" (see Aggregator)
+    budget: budget.NoteBudget bounding the output to the best-scoring notes
+    that fit its note/token limits, per document or per chapter; the
+    explainability report then gets a "budget" block on what was cut.
+    Not supported together with previous, nor can such an output be
+    passed as previous later
+    accumulator: explainability.ReportAccumulator filled as each section is
+    summarized, so its partial() gives live statistics while a long document
+    runs; one is created when not given. The report is built from it in the
+    same pass, except with dedup_threshold or budget, which change
+    document_summary after the fact
+    checkpoint: checkpoint.SectionJournal; every summarized section is
+    appended to it as it completes, and sections already in it (same
+    position, section_id and content) are taken from it, so a run that
+    died part way resumes where it stopped
+    nlp: a ready spaCy-compatible pipeline to use instead of loading
+    nlp_config's model, e.g. the stub model of benchmarks/
+    metrics: metrics.PipelineMetrics; collects per-section and total stage
+    times, counts and (optionally) tracemalloc peaks into a "metrics"
+    block of the output and its sinks
+    hooks: hooks.PipelineHooks whose before/after callbacks run around
+    each stage, e.g. profiling.SectionProfiler's
     """
+    if previous is not None and budget is not None:
+        raise ValueError("update_document does not support a note budget")
+    if previous is not None and previous.get("analysis", {}).get("budget") is not None:
+        #Its chapter lists are trimmed but its manifest counts are not
+        raise ValueError("update_document cannot update an output trimmed by a note budget")
     #Initialize modules
-    sp = SentenceProcessor()
+    sp = SentenceProcessor(single_pass=single_pass, config=nlp_config,
+                           entity_cache_size=entity_cache_size, compact=compact, nlp=nlp)
     cl = Classifier()
     ss = SectionSummarizer()
-    ag = Aggregator()
-    ex = Explainability()
+    ag = Aggregator(by_reference=summary_refs, dedup_threshold=dedup_threshold, budget=budget)
+    sections = iter_sections(doc_structure)
+    revision = _PreviousRevision(previous) if previous is not None else None
+    if accumulator is None:
+        accumulator = ReportAccumulator()
+    if metrics is not None:
+        metrics.start(doc_structure.get("doc_id"))
+        sections = metrics.reading(sections)
     processed_sections = []
-    #Process each chapter and section
-    for chapter_idx, chapter in enumerate(doc_structure.get("chapters", [])):
-        #Get or generate chapter_id
-        chapter_id = chapter.get("chapter_id", f"chapter_{chapter_idx + 1}")
-        for section in chapter.get("sections", []):
-            #Add chapter_id to section for processing
-            section["chapter_id"] = chapter_id
-            try:
-                #Step1:Sentence processing
-                processed=sp.process_section(section)
-                #Step2:Classification
-                classified=cl.classify_sentences(processed)
-                #Step3:Section summarization
-                summarized=ss.summarize_section(classified)
-                processed_sections.append(summarized)
-            except Exception as e:
-                #Log error but continue processing
-                print(f"Error processing section {section.get('section_id')}: {str(e)}")
-                continue
+    manifest = []
+    for summarized, content_hash in _summarized_sections(
+        sections, sp, cl, ss, batch_size=batch_size, n_process=n_process, cache=cache,
+        reuse=revision.take if revision is not None else None, journal=checkpoint,
+        metrics=metrics, hooks=hooks
+    ):
+        processed_sections.append(summarized)
+        accumulator.add_section(summarized)
+        if on_section is not None:
+            on_section(summarized)
+        manifest.append(manifest_entry(summarized, content_hash))
+    if revision is None:
+        return assemble_document(doc_structure, processed_sections, manifest, accumulator,
+                                 aggregator=ag, metrics=metrics, hooks=hooks)
+    changes, changed_chapters = revision.diff(manifest)
+    result = assemble_document(doc_structure, processed_sections, manifest, accumulator,
+                               aggregator=ag, previous_analysis=previous["analysis"],
+                               changed_chapters=changed_chapters, metrics=metrics, hooks=hooks)
+    if metrics is None:
+        #Not measured this time; the previous run's block would be stale
+        previous.pop("metrics", None)
+    previous.update(result)
+    previous["changes"] = changes
+    return previous
+
+def manifest_entry(summarized, content_hash):
+    """
+    The "sections" entry of the output for one summarized section.
+    """
+    return {
+        "chapter_id": summarized.get("chapter_id"),
+        "section_id": summarized.get("section_id"),
+        "content_hash": content_hash,
+        "counts": {k: len(v) for k, v in summarized["summary"].items()}
+    }
+
+def assemble_document(doc_structure, sections, manifest, accumulator, aggregator=None,
+                      previous_analysis=None, changed_chapters=None, metrics=None, hooks=None):
+    """
+    Steps 4-5 and the process_document output, once every section has
+    been summarized:
+    sections: the summarized sections, in document order
+    manifest: their manifest_entry, in the same order
+    accumulator: the ReportAccumulator every section was added to
+    aggregator: the Aggregator to use (a default one when not given)
+    previous_analysis, changed_chapters: update previous_analysis instead
+    of aggregating from scratch (see Aggregator.update_document)
+    metrics, hooks: as for process_document
+    """
+    ag = aggregator or Aggregator()
     #Step4:Aggregation
-    aggregated=ag.aggregate_document(processed_sections)
+    if hooks is not None:
+        hooks.run_before("aggregate_document", sections)
+    started = perf_counter()
+    if previous_analysis is None:
+        aggregated=ag.aggregate_document(sections)
+    else:
+        aggregated=ag.update_document(previous_analysis, sections, changed_chapters)
+    aggregation_seconds = perf_counter() - started
+    if hooks is not None:
+        hooks.run_after("aggregate_document", sections, aggregated)
+        hooks.run_before("generate_report", aggregated)
     #Step5:Explainability
-    report=ex.generate_report(aggregated)
+    started = perf_counter()
+    if ag.dedup is None and ag.budget is None:
+        report=accumulator.report(aggregated)
+    else:
+        report=accumulator.ex.generate_report(aggregated)
+    report_seconds = perf_counter() - started
+    if hooks is not None:
+        hooks.run_after("generate_report", aggregated, report)
+    if metrics is not None:
+        metrics.add_stage("aggregation", aggregation_seconds)
+        metrics.add_stage("explainability", report_seconds)
     #Return final compressed output
-    return {
+    result = {
         "doc_id": doc_structure.get("doc_id"),
         "metadata": doc_structure.get("metadata", {}),
         "analysis": aggregated,
         "explainability": report,
-        "traceability_enabled": True
+        "traceability_enabled": True,
+        "sections": manifest
     }
+    if metrics is not None:
+        result["metrics"] = metrics.finish()
+    return result
+
+def update_document(previous_output, doc_structure, **options):
+    """
+    Brings the process_document output of a previous revision up to date
+    with doc_structure, in place. Sections are matched by section_id (and
+    occurrence, for repeated ids) plus content hash: only added or changed
+    sections go through Steps 1-3, unchanged ones reuse their notes with
+    sources re-pointed at their new pages. Chapters whose sections are all
+    unchanged keep their aggregated entry; the document summary and the
+    explainability report are refreshed from the chapter lists.
+    Takes the same options as process_document and returns
+    previous_output, with a "changes" block:
+    {"added": [...], "removed": [...], "changed": [...], "unchanged": n}
+    """
+    return process_document(doc_structure, previous=previous_output, **options)
+
+class _PreviousRevision:
+    """
+    Per-section summaries of a previous process_document output, sliced out
+    of its chapter note lists using the section manifest.
+    """
+    def __init__(self, previous):
+        self.manifest = previous.get("sections", [])
+        chapters = {
+            ch["chapter_id"]: ch for ch in previous.get("analysis", {}).get("chapters", [])
+        }
+        cursors = {}
+        seen = {}
+        self.summaries = {}
+        for entry in self.manifest:
+            chapter = chapters.get(entry["chapter_id"])
+            if chapter is None:
+                continue
+            cursor = cursors.setdefault(entry["chapter_id"], {})
+            summary = {}
+            for k, count in entry["counts"].items():
+                start = cursor.get(k, 0)
+                summary[k] = chapter["aggregated"].get(k, [])[start:start + count]
+                cursor[k] = start + count
+            ident = self._ident(entry["section_id"], seen)
+            self.summaries[ident] = (entry["content_hash"], summary)
+        self._seen = {}
+
+    def _ident(self, section_id, seen):
+        occurrence = seen.get(section_id, 0)
+        seen[section_id] = occurrence + 1
+        return (section_id, occurrence)
+
+    def take(self, section, content_hash):
+        """
+        The previous summary of section if its content is unchanged, else
+        None. Must be called for the new sections in document order.
+        """
+        known = self.summaries.get(self._ident(section.get("section_id"), self._seen))
+        if known is None or known[0] != content_hash:
+            return None
+        return {"summary": known[1]}
+
+    def diff(self, manifest):
+        """
+        Compares the new manifest with the previous one. Returns the changes
+        block and the set of chapter_ids whose sections differ.
+        """
+        def index(entries):
+            seen = {}
+            by_ident = {}
+            by_chapter = {}
+            for entry in entries:
+                ident = self._ident(entry["section_id"], seen)
+                by_ident[ident] = entry["content_hash"]
+                by_chapter.setdefault(entry["chapter_id"], []).append(
+                    (ident, entry["content_hash"])
+                )
+            return by_ident, by_chapter
+        old, old_chapters = index(self.manifest)
+        new, new_chapters = index(manifest)
+        changes = {
+            "added": [ident[0] for ident in new if ident not in old],
+            "removed": [ident[0] for ident in old if ident not in new],
+            "changed": [
+                ident[0] for ident in new if ident in old and old[ident] != new[ident]
+            ],
+            "unchanged": sum(1 for ident in new if old.get(ident) == new[ident])
+        }
+        changed_chapters = {
+            chapter_id for chapter_id, entries in new_chapters.items()
+            if old_chapters.get(chapter_id) != entries
+        }
+        return changes, changed_chapters
+
+def _processed_sections(sp, sections, batch_size, n_process):
+    """
+    Step1 for every section, as (section, processed) pairs in input order;
+    processed is None when the section failed.
+    """
+    if batch_size is None and n_process == 1:
+        for section in sections:
+            try:
+                yield section, sp.process_section(section)
+            except Exception as e:
+                print(f"Error processing section {section.get('section_id')}: {str(e)}")
+                yield section, None
+    else:
+        yield from sp.process_sections(sections, batch_size=batch_size, n_process=n_process)
+
+def _summarized_sections(sections, sp, cl, ss, batch_size=None, n_process=1, cache=None, reuse=None,
+                         journal=None, metrics=None, hooks=None):
+    """
+    Runs Steps 1-3 and yields (summarized, content_hash) pairs in input
+    order. Sections that reuse(section, content_hash), the journal or the
+    cache already have a summary for are queued in place and skip the NLP
+    stages. Everything not taken from the journal is appended to it.
+    Each section is recorded in metrics, when given, as it is yielded,
+    and hooks run around each stage.
+    """
+    fingerprint = {"nlp": sp.fingerprint(), "classifier": cl.fingerprint()}
+    pending = deque()
+    def uncached():
+        for ordinal, section in enumerate(sections):
+            key = content_key(section.get("raw_text", ""), fingerprint)
+            entry = {"section": section, "key": key, "summarized": None, "ordinal": ordinal,
+                     "origin": "processed"}
+            known = reuse(section, key) if reuse is not None else None
+            if known is not None:
+                entry["origin"] = "previous"
+            if known is None and journal is not None:
+                known = journal.get(ordinal, section.get("section_id"), key)
+                if known is not None:
+                    entry["origin"] = "journal"
+            if known is None and cache is not None:
+                known = cache.get(key)
+                if known is not None:
+                    entry["origin"] = "cache"
+            if known is not None:
+                entry["summarized"] = _restamp(sp, known, section,
+                                               shared=entry["origin"] == "previous")
+            pending.append(entry)
+            if entry["summarized"] is None:
+                if hooks is not None:
+                    hooks.run_before("process_section", section)
+                yield section
+    def done(entry):
+        if journal is not None and entry["origin"] != "journal":
+            journal.append(entry["ordinal"], entry["section"].get("section_id"),
+                           entry["key"], entry["summarized"])
+        if metrics is not None:
+            metrics.add_section(entry["section"], entry["summarized"], entry["origin"],
+                                entry.get("processing"), entry.get("timings"))
+        return entry["summarized"], entry["key"]
+    #Step1:Sentence processing
+    stream = _processed_sections(sp, uncached(), batch_size, n_process)
+    if metrics is not None:
+        stream = metrics.processing(stream, sp)
+    for section, processed in stream:
+        #Cache hits queued ahead of this section keep their place
+        while pending[0]["summarized"] is not None:
+            yield done(pending.popleft())
+        entry = pending.popleft()
+        if metrics is not None:
+            entry["processing"] = metrics.last_processing
+        if processed is None:
+            if metrics is not None:
+                metrics.add_section(section, None, "failed", entry["processing"])
+            continue
+        if hooks is not None:
+            hooks.run_after("process_section", section, processed)
+        try:
+            #Step2:Classification
+            if hooks is not None:
+                hooks.run_before("classify_sentences", processed)
+            started = perf_counter()
+            classified=cl.classify_sentences(processed)
+            classification_seconds = perf_counter() - started
+            if hooks is not None:
+                hooks.run_after("classify_sentences", processed, classified)
+                hooks.run_before("summarize_section", classified)
+            #Step3:Section summarization
+            started = perf_counter()
+            summarized=ss.summarize_section(classified)
+            entry["timings"] = {
+                "classification": classification_seconds,
+                "summarization": perf_counter() - started
+            }
+            if hooks is not None:
+                hooks.run_after("summarize_section", classified, summarized)
+        except Exception as e:
+            #Log error but continue processing
+            print(f"Error processing section {section.get('section_id')}: {str(e)}")
+            if metrics is not None:
+                metrics.add_section(section, None, "failed", entry.get("processing"))
+            continue
+        if cache is not None:
+            cache.put(entry["key"], summarized)
+        entry["summarized"] = summarized
+        yield done(entry)
+    while pending:
+        yield done(pending.popleft())
+
+def summarize_batch(sections, sp, cl, ss, batch_size=None, n_process=1):
+    """
+    Steps 1-3 for a list of sections, e.g. a micro-batch gathered from
+    several documents. Returns [(summarized, content_hash), ...] aligned
+    with sections; summarized is None for a section that failed.
+    """
+    fingerprint = {"nlp": sp.fingerprint(), "classifier": cl.fingerprint()}
+    results = []
+    for section, processed in _processed_sections(sp, sections, batch_size, n_process):
+        key = content_key(section.get("raw_text", ""), fingerprint)
+        summarized = None
+        if processed is not None:
+            try:
+                summarized = ss.summarize_section(cl.classify_sentences(processed))
+            except Exception as e:
+                print(f"Error processing section {section.get('section_id')}: {str(e)}")
+        results.append((summarized, key))
+    return results
+
+def _restamp(sp, summarized, section, shared=False):
+    """
+    Points a summary computed for the same text elsewhere at section: the
+    ids, title, page range and every note's source are rebuilt from it.
+    shared: the notes are also in the previous output's chapter lists,
+    which unchanged chapters keep, so they are updated in place and never
+    replaced by compact records.
+    """
+    header = sp.section_header(section)
+    make_source = sp.source_builder(section, header)
+    for notes in summarized["summary"].values():
+        for idx, note in enumerate(notes):
+            source = make_source(note["source"]["char_offset"], len(note["statement"]))
+            if isinstance(note, Note):
+                note.source = source
+            elif sp.compact and not shared:
+                notes[idx] = Note.from_dict(note, source)
+            else:
+                note["source"] = source.to_dict() if isinstance(source, Source) else source
+    return dict(header, summary=summarized["summary"])
+
+def iter_sections(doc_structure):
+    """
+    Yields every section of the document in order, tagged with its chapter_id
+    (the sections of a pdf_reader stream already are).
+    """
+    if "sections" in doc_structure:
+        yield from doc_structure["sections"]
+        return
+    for chapter_idx, chapter in enumerate(doc_structure.get("chapters", [])):
+        #Get or generate chapter_id
+        chapter_id = chapter.get("chapter_id", f"chapter_{chapter_idx + 1}")
+        for section in chapter.get("sections", []):
+            #Add chapter_id to section for processing
+            section["chapter_id"] = chapter_id
+            yield section
 
 def get_drill_down(compressed_output, item_type, index):
     """
     Helper function to drill down into specific items.
     Args:
-        compressed_output: Output from process_document
+        compressed_output: Output from process_document, or an OutputStore
+            opened on a file from output_store.write_sqlite
         item_type: "rules", "exceptions", "constraints", etc.
         index: Index of the item in that category
     Returns:
         Full details including source location
     """
-    doc_summary=compressed_output.get("analysis", {}).get("document_summary", {})
-    items=doc_summary.get(item_type, [])
-    if index<0 or index>=len(items):
+    if isinstance(compressed_output, OutputStore):
+        item=compressed_output.get_note(item_type, index)
+    else:
+        item=resolve_note(compressed_output.get("analysis", {}), item_type, index)
+    if item is None:
         return {"error": "Index out of range"}
-    item = items[index]
+    return drill_down_payload(item)
+
+def drill_down_payload(item):
+    """
+    The get_drill_down details of one note.
+    """
+    if isinstance(item, Note):
+        item = item.to_dict()
     return {
         "statement": item.get("statement"),
         "type": item.get("type"),
         "importance": item.get("importance"),
         "entities": item.get("entities"),
         "source": item.get("source"),
+        #Every location of a note merged with its near-duplicates, or None
+        "sources": item.get("sources"),
         "drill_down_instructions": (
             f"See {item.get('source', {}).get('section_id')} "
             f"on pages {item.get('source', {}).get('page_start')}-"
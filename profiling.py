@@ -0,0 +1,166 @@
+import argparse
+import cProfile
+import heapq
+import json
+import os
+import pstats
+import sys
+import time
+from hooks import PipelineHooks
+from pipeline import process_document
+from pdf_reader import stream_document
+from sentence_processor import NLPConfig
+
+class SectionProfiler:
+    """
+    Profiles Steps 1-3 of every section with cProfile and keeps the top
+    slowest ones, to find the giant tables and appendices that dominate a
+    run:
+        profiler = SectionProfiler(top=10)
+        process_document(doc_structure, hooks=profiler.hooks())
+        profiler.report()
+    A section's profile runs from before("process_section") to
+    after("summarize_section"), so run with the default batch_size=None and
+    n_process=1; with nlp.pipe batching several sections are in Step1 at
+    once and a section cannot be told apart from its neighbours.
+    cProfile slows the run down, so the seconds are only comparable with
+    each other.
+    """
+    def __init__(self, top=10, functions=10, hooks=None):
+        self.top = top
+        self.functions = functions
+        self.sections = 0
+        self._hooks = hooks
+        self._registered = False
+        self._slowest = []
+        self._current = None
+
+    def hooks(self):
+        """
+        The PipelineHooks to hand to process_document, with the profiler's
+        callbacks added (to the hooks given to __init__, if any).
+        """
+        if self._hooks is None:
+            self._hooks = PipelineHooks()
+        if not self._registered:
+            self._hooks.before("process_section", self._start)
+            self._hooks.after("process_section", self._check)
+            self._hooks.after("summarize_section", self._stop)
+            self._hooks.before("aggregate_document", self._abandon)
+            self._registered = True
+        return self._hooks
+
+    #Hooks
+    def _start(self, section):
+        #A section that failed after Step1 never reached _stop
+        self._abandon()
+        profile = cProfile.Profile()
+        self._current = {
+            "section": section,
+            "profile": profile,
+            "started": time.perf_counter()
+        }
+        profile.enable()
+
+    def _check(self, section, processed):
+        if self._current is None or self._current["section"] is not section:
+            self._abandon()
+            raise ValueError("SectionProfiler needs sections processed one at a time "
+                             "(batch_size=None, n_process=1)")
+
+    def _stop(self, classified, summarized):
+        current = self._current
+        if current is None:
+            return
+        current["profile"].disable()
+        self._current = None
+        section = current["section"]
+        self.sections += 1
+        entry = {
+            "chapter_id": summarized.get("chapter_id"),
+            "section_id": summarized.get("section_id"),
+            "title": summarized.get("title"),
+            "chars": len(section.get("raw_text") or ""),
+            "sentences": sum(len(v) for v in summarized["summary"].values()),
+            "seconds": round(time.perf_counter() - current["started"], 6)
+        }
+        #Only the slowest sections keep their profile
+        item = (entry["seconds"], self.sections, entry, current["profile"])
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, item)
+        elif item[:2] > self._slowest[0][:2]:
+            heapq.heapreplace(self._slowest, item)
+
+    def _abandon(self, *args):
+        if self._current is not None:
+            self._current["profile"].disable()
+            self._current = None
+
+    #Report
+    def report(self):
+        """
+        The slowest sections, slowest first:
+        [{"chapter_id", "section_id", "title", "chars", "sentences",
+          "seconds", "hottest": [{"function", "calls", "self_seconds",
+                                  "cumulative_seconds"}, ...]}, ...]
+        with their functions ordered by time spent in the function itself.
+        """
+        slowest = []
+        for _, _, entry, profile in sorted(self._slowest, key=lambda item: item[:2], reverse=True):
+            stats = pstats.Stats(profile).stats
+            hottest = heapq.nlargest(self.functions, stats.items(), key=lambda kv: kv[1][2])
+            slowest.append(dict(entry, hottest=[
+                {
+                    "function": pstats.func_std_string(func),
+                    "calls": calls,
+                    "self_seconds": round(self_time, 6),
+                    "cumulative_seconds": round(cumulative, 6)
+                }
+                for func, (_, calls, self_time, cumulative, _) in hottest
+            ]))
+        return slowest
+
+    def print_report(self, file=None):
+        file = file or sys.stdout
+        print(f"Slowest {len(self._slowest)} of {self.sections} sections:", file=file)
+        for n, entry in enumerate(self.report(), 1):
+            print(f"{n}. section {entry['section_id']} (chapter {entry['chapter_id']}): "
+                  f"{entry['seconds']:.3f}s, {entry['chars']:,} chars, {entry['sentences']} sentences",
+                  file=file)
+            for func in entry["hottest"]:
+                print(f"     {func['self_seconds']:>9.4f}s self {func['cumulative_seconds']:>9.4f}s cum "
+                      f"{func['calls']:>8} calls  {func['function']}", file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run one document through the pipeline and report its slowest sections."
+    )
+    parser.add_argument("source", help="a PDF, or a doc_structure JSON file")
+    parser.add_argument("-n", "--top", type=int, default=10, help="sections to report (default: 10)")
+    parser.add_argument("--functions", type=int, default=10,
+                        help="hottest functions per section (default: 10)")
+    parser.add_argument("--model", help="spaCy model (default: the pipeline's)")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.source):
+        print(f"Error: File not found: {args.source}")
+        return 1
+    if args.source.lower().endswith(".json"):
+        with open(args.source, encoding="utf-8") as f:
+            doc_structure = json.load(f)
+    else:
+        doc_structure = stream_document(args.source)
+        if doc_structure is None:
+            print(f"Error: Could not open PDF: {args.source}")
+            return 1
+    profiler = SectionProfiler(args.top, args.functions)
+    nlp_config = NLPConfig(args.model) if args.model else None
+    process_document(doc_structure, nlp_config=nlp_config, compact=True, hooks=profiler.hooks())
+    profiler.print_report()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profiler.report(), f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import sys
+
+ENTITY_KEYS = (
+    "dates", "numbers", "quantities", "percentages",
+    "money", "organizations", "persons"
+)
+
+#Shared by every sentence without entities in compact mode
+NO_ENTITIES = {}
+#Default of Source.get that no field value can be
+_MISSING = object()
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def compact_entities(entities):
+    """
+    Sparse form of an entity dict: only the non-empty lists are kept.
+    """
+    sparse = {k: v for k, v in entities.items() if v}
+    return sparse or NO_ENTITIES
+
+def expand_entities(entities):
+    """
+    The full seven-key entity dict of the output schema.
+    """
+    return {k: entities.get(k) or [] for k in ENTITY_KEYS}
+
+class SectionRef:
+    """
+    Identity of one section, shared by the sources of all its sentences.
+    """
+    __slots__ = ("chapter_id", "section_id", "page_start", "page_end")
+
+    def __init__(self, chapter_id, section_id, page_start, page_end):
+        self.chapter_id = _intern(chapter_id)
+        self.section_id = _intern(section_id)
+        self.page_start = page_start
+        self.page_end = page_end
+
+class Source:
+    """
+    Where one sentence came from: its shared SectionRef plus its own
+    offset and, when known, its own pages and line.
+    """
+    __slots__ = ("section", "page_start", "page_end", "char_offset", "line")
+
+    def __init__(self, section, char_offset, page_start=None, page_end=None, line=None):
+        self.section = section
+        self.char_offset = char_offset
+        self.page_start = page_start
+        self.page_end = page_end
+        self.line = line
+
+    def to_dict(self):
+        source = {
+            "chapter_id": self.section.chapter_id,
+            "section_id": self.section.section_id,
+            "page_start": self.section.page_start if self.page_start is None else self.page_start,
+            "page_end": self.section.page_end if self.page_end is None else self.page_end,
+            "char_offset": self.char_offset
+        }
+        if self.line is not None:
+            source["line"] = self.line
+        return source
+
+    #Read access in the shape of the source dict, without building it
+    def get(self, key, default=None):
+        if key in ("chapter_id", "section_id"):
+            return getattr(self.section, key)
+        if key in ("page_start", "page_end"):
+            value = getattr(self, key)
+            return getattr(self.section, key) if value is None else value
+        if key == "char_offset":
+            return self.char_offset
+        if key == "line" and self.line is not None:
+            return self.line
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+class Note:
+    """
+    One sentence as it moves through the pipeline in compact mode.
+    SentenceProcessor creates it, Classifier sets type and
+    SectionSummarizer sets importance on the same object. Entities are kept
+    sparse and the source is a Source record; to_dict gives the note dict
+    of the output schema, and get/[] read it in that shape, except that
+    entities stay sparse (absent kinds are missing rather than empty).
+    """
+    __slots__ = (
+        "sentence_id", "statement", "type", "importance", "entities", "source",
+        "sources"
+    )
+
+    def __init__(self, sentence_id, statement, entities, source, note_type=None, importance=None):
+        self.sentence_id = sentence_id
+        self.statement = statement
+        self.entities = entities
+        self.source = source
+        self.type = note_type
+        self.importance = importance
+        #Every location of a note merged with its near-duplicates
+        self.sources = None
+
+    @classmethod
+    def from_dict(cls, note, source):
+        return cls(
+            None, note["statement"], compact_entities(note.get("entities", {})),
+            source, note.get("type"), note.get("importance")
+        )
+
+    def with_sources(self, sources):
+        note = Note(
+            self.sentence_id, self.statement, self.entities, self.source,
+            self.type, self.importance
+        )
+        note.sources = sources
+        return note
+
+    def to_dict(self):
+        note = {
+            "statement": self.statement,
+            "type": self.type,
+            "importance": self.importance,
+            "entities": expand_entities(self.entities),
+            "source": self.source.to_dict()
+        }
+        if self.sources is not None:
+            note["sources"] = [
+                s.to_dict() if isinstance(s, Source) else s for s in self.sources
+            ]
+        return note
+
+    def get(self, key, default=None):
+        if key in ("statement", "text"):
+            return self.statement
+        if key == "entities":
+            return self.entities
+        if key in ("sentence_id", "type", "importance", "source", "sources"):
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+def json_default(obj):
+    """
+    json.dump(..., default=json_default) writes records in the output
+    schema, converting one note at a time.
+    """
+    if isinstance(obj, (Note, Source)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,112 @@
+import heapq
+import json
+import math
+import re
+from records import Note, json_default
+from pipeline import drill_down_payload
+from aggregator import resolve_notes
+
+#Bump when the saved layout changes
+INDEX_FORMAT = 1
+
+_TOKEN = re.compile(r"\w+(?:[.,]\d+)*")
+
+def tokenize(text):
+    return [t.lower() for t in _TOKEN.findall(text or "")]
+
+class SearchIndex:
+    """
+    Inverted index with BM25 ranking over the statements and entity values
+    of retained notes, for answering questions against the compressed
+    output:
+        index = SearchIndex()
+        index.add_output(process_document(doc))
+        index.search("termination notice period", k=5)
+    add_output indexes the final document_summary, after deduplication and
+    any note budget. Sections can also be added as they finish with
+    add_section, but those are every note before either is applied.
+    Results are drill-down payloads with a "score", best first. save/load
+    keep it next to the output.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.notes = []
+        self.lengths = []
+        self.total_length = 0
+        #term -> [[note, term frequency], ...] in note order
+        self.postings = {}
+
+    #Building
+    def add_section(self, summarized):
+        for notes in summarized.get("summary", {}).values():
+            for note in notes:
+                self.add_note(note)
+
+    def add_output(self, compressed_output):
+        analysis = compressed_output.get("analysis", {})
+        for category in analysis.get("document_summary", {}):
+            for note in resolve_notes(analysis, category):
+                self.add_note(note)
+
+    def add_note(self, note):
+        doc = len(self.notes)
+        self.notes.append(note)
+        tokens = tokenize(note.get("statement"))
+        for values in (note.get("entities") or {}).values():
+            for value in values:
+                tokens.extend(tokenize(value))
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            self.postings.setdefault(t, []).append([doc, tf])
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+    #Query
+    def search(self, query, k=10):
+        n = len(self.notes)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        results = []
+        for doc, score in heapq.nlargest(k, scores.items(), key=lambda x: (x[1], -x[0])):
+            payload = drill_down_payload(self.notes[doc])
+            payload["score"] = round(score, 4)
+            results.append(payload)
+        return results
+
+    #Persistence
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": INDEX_FORMAT,
+                "k1": self.k1,
+                "b": self.b,
+                "notes": [n.to_dict() if isinstance(n, Note) else n for n in self.notes],
+                "lengths": self.lengths,
+                "postings": self.postings
+            }, f, ensure_ascii=False, default=json_default, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported search index format: {data.get('format')}")
+        index = cls(data["k1"], data["b"])
+        index.notes = data["notes"]
+        index.lengths = data["lengths"]
+        index.total_length = sum(index.lengths)
+        index.postings = data["postings"]
+        return index
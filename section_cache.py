@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+from records import json_default
+
+#Bump when the shape of a cached section summary changes
+CACHE_FORMAT = 1
+#Cache hits whose recency is kept in memory before it is written out
+TOUCH_BATCH = 256
+
+def content_key(raw_text, fingerprint):
+    """
+    Content hash of a section: its raw text plus the fingerprint of the
+    setup that summarizes it.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_FORMAT, fingerprint], sort_keys=True).encode("utf-8"))
+    h.update(b"\0")
+    h.update((raw_text or "").encode("utf-8"))
+    return h.hexdigest()
+
+class SectionCache:
+    """
+    Persistent cache of summarized sections in a single SQLite file.
+    Entries are keyed by a hash of the section's raw text plus a
+    fingerprint of everything that can change its summary (spaCy model and
+    version, enabled components, classifier keywords). Once the stored
+    entries go over max_bytes the least recently used ones are evicted.
+    """
+    def __init__(self, path="section_cache.sqlite", max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS sections_last_used ON sections (last_used)"
+        )
+        self._db.commit()
+        #key -> last_used of hits not yet written, so reads do not commit
+        self._touched = {}
+        self._size, self._clock = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(last_used), 0) FROM sections"
+        ).fetchone()
+
+    #Keys
+    def make_key(self, raw_text, fingerprint):
+        return content_key(raw_text, fingerprint)
+
+    #Lookup
+    def get(self, key):
+        row = self._db.execute(
+            "SELECT value FROM sections WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._clock += 1
+        self._touched[key] = self._clock
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touched()
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False, default=json_default)
+        size = len(data.encode("utf-8"))
+        old = self._db.execute(
+            "SELECT size FROM sections WHERE key = ?", (key,)
+        ).fetchone()
+        self._clock += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO sections (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, data, size, self._clock)
+        )
+        self._size += size - (old[0] if old else 0)
+        self._touched.pop(key, None)
+        #Eviction orders by last_used, so pending hits go in first
+        self._flush_touched()
+        self._evict()
+        self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE sections SET last_used = ? WHERE key = ?",
+                [(clock, key) for key, clock in self._touched.items()]
+            )
+            self._touched.clear()
+
+    #Eviction
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM sections ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM sections WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+                if self._size <= self.max_bytes:
+                    break
+
+    #Stats
+    def stats(self):
+        entries = self._db.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._size
+        }
+
+    def close(self):
+        self._flush_touched()
+        self._db.commit()
+        self._db.close()
@@ -1,3 +1,5 @@
+from records import Note
+
 class SectionSummarizer:
     def __init__(self):
         pass
@@ -55,6 +57,10 @@ class SectionSummarizer:
     
     #Note creation
     def _create_note(self, sentence_obj):
+        #Compact mode: the classified record becomes the note itself
+        if isinstance(sentence_obj, Note):
+            sentence_obj.importance=self._estimate_importance(sentence_obj.type, sentence_obj.entities)
+            return sentence_obj
         note_type=sentence_obj["type"]
         importance=self._estimate_importance(
             note_type,
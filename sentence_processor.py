@@ -1,13 +1,115 @@
 import re
-import spacy
+from bisect import bisect_right
+from collections import deque, OrderedDict
 from dateutil.parser import parse as parse_date
+from records import Note, Source, SectionRef, compact_entities
 
-# Load spaCy model
-nlp = spacy.load("en_core_web_md")
+DEFAULT_MODEL = "en_core_web_md"
+
+class NLPConfig:
+    """
+    Which spaCy model SentenceProcessor loads and which components it runs.
+    model: package name passed to spacy.load
+    exclude: components that are not loaded at all,
+             e.g. ["lemmatizer", "attribute_ruler"]
+    use_senter: split sentences with the statistical "senter" component
+                instead of the full dependency parser (the parser is excluded)
+    """
+    def __init__(self, model=DEFAULT_MODEL, exclude=None, use_senter=False):
+        self.model = model
+        self.exclude = list(exclude or [])
+        self.use_senter = use_senter
+
+    def key(self):
+        return (self.model, tuple(sorted(self.exclude)), self.use_senter)
+
+#Loaded models, shared process-wide and keyed by NLPConfig.key()
+_models = {}
+
+def get_nlp(config=None):
+    """
+    Returns the spaCy pipeline for config, loading it on first use only.
+    """
+    config = config or NLPConfig()
+    key = config.key()
+    if key not in _models:
+        import spacy
+        exclude = list(config.exclude)
+        if config.use_senter and "parser" not in exclude:
+            exclude.append("parser")
+        model = spacy.load(config.model, exclude=exclude)
+        if config.use_senter and "senter" not in model.pipe_names:
+            model.enable_pipe("senter")
+        _models[key] = model
+    return _models[key]
+
+def __getattr__(name):
+    #Module-level nlp is kept for callers that imported it, but loads lazily
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class EntityMemo:
+    """
+    Bounded LRU of entity dicts keyed by whitespace-normalized sentence
+    text, so repeated boilerplate sentences are only run through NER once.
+    Stored dicts are shared between the sentences that hit them, so they
+    are read-only: nothing after Step1 changes a note's entities.
+    """
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def key(self, sentence):
+        return " ".join(sentence.split())
+
+    def get(self, key):
+        entities = self._items.get(key)
+        if entities is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return entities
+
+    def put(self, key, entities):
+        self._items[key] = entities
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "size": len(self._items),
+            "max_size": self.max_size
+        }
 
 class SentenceProcessor:
-    def __init__(self):
-        self.nlp = nlp
+    def __init__(self, single_pass=False, config=None, entity_cache_size=10000, compact=False, nlp=None):
+        self.config = config or NLPConfig()
+        #A ready pipeline (e.g. a stub for offline benchmarks) replaces config's model
+        self._nlp = nlp
+        self._injected = nlp is not None
+        #Take entities from the section parse instead of re-parsing each sentence
+        self.single_pass = single_pass
+        #Per-sentence entities of repeated sentences; 0 disables the memo
+        self.entity_memo = EntityMemo(entity_cache_size) if entity_cache_size else None
+        #Sentences as records.Note with sparse entities and shared section refs
+        self.compact = compact
+        #Texts run through the NLP pipeline (section parses and NER calls)
+        self.nlp_calls = 0
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = get_nlp(self.config)
+        return self._nlp
 
     def process_section(self, section):
         """
@@ -19,6 +121,11 @@ class SentenceProcessor:
             "page_range": [start, end],  # e.g., [10, 12]
             "raw_text": "..."
         }
+        Sections from pdf_reader ("section_title", "page_start", "page_end")
+        are accepted as well. When the section carries pdf_reader's
+        "offset_index", each sentence's source gets the pages it actually
+        spans and the 1-based "line" on its first page instead of the whole
+        section's page range.
         Output Format:
         {
             "chapter_id": "...",
@@ -43,36 +150,168 @@ class SentenceProcessor:
         }
         """
         text=self._clean_text(section.get("raw_text", ""))
-        sentences=self._split_sentences(text)
-        #Extract page range
-        page_range=section.get("page_range", [None, None])
-        page_start=page_range[0] if isinstance(page_range, list) and len(page_range)>0 else None
-        page_end=page_range[1] if isinstance(page_range, list) and len(page_range)>1 else None
+        if self.single_pass:
+            analyzed=self._split_with_entities(text)
+        else:
+            analyzed=[(sent, self._extract_entities(sent)) for sent in self._split_sentences(text)]
+        return self._build_section(section, analyzed)
+
+    #Batched Processing
+    def process_sections(self, sections, batch_size=None, n_process=1):
+        """
+        Batched counterpart of process_section. Streams the cleaned text of
+        every section through nlp.pipe and yields (section, processed) pairs
+        in input order. A section that fails is reported and yielded with
+        processed=None so callers can keep their own bookkeeping in step.
+        """
+        pending=deque()
+        def texts():
+            for section in sections:
+                pending.append(section)
+                yield self._clean_text(section.get("raw_text", ""))
+        for doc in self.nlp.pipe(texts(), batch_size=batch_size, n_process=n_process):
+            self.nlp_calls+=1
+            section=pending.popleft()
+            try:
+                if self.single_pass:
+                    analyzed=self._doc_with_entities(doc)
+                else:
+                    sentences=self._doc_sentences(doc)
+                    analyzed=list(zip(sentences, self._pipe_entities(sentences, batch_size)))
+                processed=self._build_section(section, analyzed)
+            except Exception as e:
+                print(f"Error processing section {section.get('section_id')}: {str(e)}")
+                processed=None
+            yield section, processed
+
+    def _build_section(self, section, analyzed):
+        header=self.section_header(section)
+        make_source=self.source_builder(section, header)
         processed=[]
         char_offset=0
-        for idx, sent in enumerate(sentences):
-            entities=self._extract_entities(sent)
-            processed.append({
-                "sentence_id": idx,
-                "text": sent,
-                "entities": entities,
-                "source": {
-                    "chapter_id": section.get("chapter_id"),
-                    "section_id": section.get("section_id"),
-                    "page_start": page_start,
-                    "page_end": page_end,
-                    "char_offset": char_offset
-                }
-            })
+        for idx, (sent, entities) in enumerate(analyzed):
+            if self.compact:
+                processed.append(Note(idx, sent, entities, make_source(char_offset, len(sent))))
+            else:
+                processed.append({
+                    "sentence_id": idx,
+                    "text": sent,
+                    "entities": entities,
+                    "source": make_source(char_offset, len(sent))
+                })
             char_offset+=len(sent) + 1  # +1 for space/period
+        return dict(header, sentences=processed)
+
+    def section_header(self, section):
+        """
+        The identifying fields of process_section's output for section:
+        chapter_id, section_id, title, page_start and page_end.
+        """
+        #Extract page range
+        page_range=section.get("page_range", [section.get("page_start"), section.get("page_end")])
+        page_start=page_range[0] if isinstance(page_range, list) and len(page_range)>0 else None
+        page_end=page_range[1] if isinstance(page_range, list) and len(page_range)>1 else None
         return {
             "chapter_id": section.get("chapter_id"),
             "section_id": section.get("section_id"),
-            "title": section.get("Title", section.get("title", "")),
+            "title": section.get("Title", section.get("title", section.get("section_title", ""))),
             "page_start": page_start,
-            "page_end": page_end,
-            "sentences": processed
+            "page_end": page_end
         }
+
+    def source_builder(self, section, header=None):
+        """
+        Returns make_source(char_offset, length), building the source dict of
+        a sentence of section that starts at char_offset in the cleaned text
+        (a records.Source sharing one SectionRef in compact mode).
+        Also used to re-point sentences whose summary was computed earlier.
+        """
+        header=header or self.section_header(section)
+        locate=self._page_locator(section)
+        if self.compact:
+            ref=SectionRef(
+                header["chapter_id"], header["section_id"],
+                header["page_start"], header["page_end"]
+            )
+            def make_record(char_offset, length):
+                if locate is None:
+                    return Source(ref, char_offset)
+                page_start, line=locate(char_offset)
+                page_end=locate(char_offset + max(length - 1, 0))[0]
+                return Source(ref, char_offset, page_start, page_end, line)
+            return make_record
+        def make_source(char_offset, length):
+            source={
+                "chapter_id": header["chapter_id"],
+                "section_id": header["section_id"],
+                "page_start": header["page_start"],
+                "page_end": header["page_end"],
+                "char_offset": char_offset
+            }
+            if locate is not None:
+                source["page_start"], source["line"]=locate(char_offset)
+                source["page_end"]=locate(char_offset + max(length - 1, 0))[0]
+            return source
+        return make_source
+
+    def fingerprint(self):
+        """
+        Everything about this processor's setup that can change its output,
+        for keying cached results.
+        """
+        if self._injected:
+            meta = getattr(self._nlp, "meta", {})
+            return {
+                "model": meta.get("name", type(self._nlp).__name__),
+                "model_version": meta.get("version"),
+                "spacy_version": None,
+                "single_pass": self.single_pass
+            }
+        import spacy
+        return {
+            "model": self.config.model,
+            "model_version": spacy.util.get_package_version(self.config.model),
+            "spacy_version": spacy.__version__,
+            "exclude": sorted(self.config.exclude),
+            "use_senter": self.config.use_senter,
+            "single_pass": self.single_pass
+        }
+
+    #Page Mapping
+    def _page_locator(self, section):
+        """
+        Returns a function mapping a char offset in the cleaned section text
+        to (page_number, line_number), built from pdf_reader's offset_index,
+        or None if the section has no index. Lines are cleaned one at a time
+        to find where each starts in the cleaned text.
+        """
+        index=section.get("offset_index")
+        if not index:
+            return None
+        starts=[]
+        spots=[]
+        run=-1
+        line_number=None
+        cleaned_pos=0
+        raw_pos=0
+        for line in section.get("raw_text", "").split("\n"):
+            while run + 1 < len(index) and index[run + 1][0] <= raw_pos:
+                run+=1
+                line_number=index[run][2]
+            cleaned=self._clean_text(line)
+            if cleaned and run >= 0:
+                starts.append(cleaned_pos)
+                spots.append((index[run][1], line_number))
+                cleaned_pos+=len(cleaned) + 1
+            raw_pos+=len(line) + 1
+            if line_number is not None:
+                line_number+=1
+        if not starts:
+            return None
+        def locate(char_offset):
+            return spots[max(bisect_right(starts, char_offset) - 1, 0)]
+        return locate
+
     #Text Cleaning
     def _clean_text(self, text: str):
         if not text:
@@ -90,18 +329,89 @@ class SentenceProcessor:
     def _split_sentences(self, text):
         if not text:
             return []
-        doc = self.nlp(text)
+        self.nlp_calls += 1
+        return self._doc_sentences(self.nlp(text))
+
+    def _doc_sentences(self, doc):
         sentences = [sent.text.strip() for sent in doc.sents]
         #Fallback if spaCy fails
         if len(sentences) == 0:
-            sentences = re.split(r"[.!?]+", text)
+            sentences = re.split(r"[.!?]+", doc.text)
         #Remove empty or very short sentences
         sentences = [s for s in sentences if len(s) > 2]
         return sentences
 
+    #Single-pass Splitting
+    def _split_with_entities(self, text):
+        """
+        Parses the section once and returns (sentence, entities) pairs,
+        taking each sentence's entities from the doc.ents inside its span.
+        """
+        if not text:
+            return []
+        self.nlp_calls += 1
+        return self._doc_with_entities(self.nlp(text))
+
+    def _doc_with_entities(self, doc):
+        sents = list(doc.sents)
+        #Fallback if spaCy fails
+        if len(sents) == 0:
+            sentences = [s for s in re.split(r"[.!?]+", doc.text) if len(s) > 2]
+            return [(s, self._extract_entities(s)) for s in sentences]
+        analyzed = []
+        for sent in sents:
+            sentence = sent.text.strip()
+            #Remove empty or very short sentences
+            if len(sentence) > 2:
+                analyzed.append((sentence, self._collect_entities(sent.ents, sentence)))
+        return analyzed
+
     #Entity Extraction
     def _extract_entities(self, sentence: str):
+        memo = self.entity_memo
+        if memo is not None:
+            key = memo.key(sentence)
+            entities = memo.get(key)
+            if entities is not None:
+                return entities
+        self.nlp_calls += 1
         doc = self.nlp(sentence)
+        entities = self._collect_entities(doc.ents, sentence)
+        if memo is not None:
+            memo.put(key, entities)
+        return entities
+
+    def _pipe_entities(self, sentences, batch_size=None):
+        """
+        Entities of every sentence, in order, running only the sentences
+        the memo does not know (once each) through nlp.pipe.
+        """
+        memo = self.entity_memo
+        if memo is None:
+            self.nlp_calls += len(sentences)
+            docs = self.nlp.pipe(sentences, batch_size=batch_size)
+            return [self._collect_entities(doc.ents, sent) for sent, doc in zip(sentences, docs)]
+        keys = [memo.key(sent) for sent in sentences]
+        found = {}
+        missing = {}
+        for key, sent in zip(keys, sentences):
+            if key in found or key in missing:
+                #Repeated within this batch: served by the first occurrence
+                memo.hits += 1
+                continue
+            entities = memo.get(key)
+            if entities is None:
+                missing[key] = sent
+            else:
+                found[key] = entities
+        self.nlp_calls += len(missing)
+        docs = self.nlp.pipe(list(missing.values()), batch_size=batch_size)
+        for (key, sent), doc in zip(missing.items(), docs):
+            found[key] = self._collect_entities(doc.ents, sent)
+            memo.put(key, found[key])
+        return [found[key] for key in keys]
+
+    def _collect_entities(self, ents, sentence: str):
         entities={
             "dates": [],
             "numbers": [],
@@ -112,7 +422,7 @@ class SentenceProcessor:
             "persons": []
         }
         # spaCy NER
-        for ent in doc.ents:
+        for ent in ents:
             if ent.label_ in ["DATE", "TIME"]:
                 entities["dates"].append(ent.text)
             elif ent.label_=="CARDINAL":
@@ -140,4 +450,6 @@ class SentenceProcessor:
         #Deduplicate
         for k in entities:
             entities[k] = list(set(entities[k]))
+        if self.compact:
+            return compact_entities(entities)
         return entities
@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+from pdf_reader import stream_document
+from pipeline import summarize_batch, iter_sections, manifest_entry, assemble_document
+from sentence_processor import SentenceProcessor, NLPConfig, get_nlp, DEFAULT_MODEL
+from classifier import Classifier
+from section_summarizer import SectionSummarizer
+from explainability import ReportAccumulator
+from records import json_default
+
+#Steps 1-3 set up once in each worker process by _init_worker
+_worker = None
+
+def _init_worker(model, use_senter):
+    global _worker
+    config = NLPConfig(model, use_senter=use_senter)
+    get_nlp(config)
+    _worker = (SentenceProcessor(config=config), Classifier(), SectionSummarizer())
+
+def _summarize_batch(sections):
+    sp, cl, ss = _worker
+    return summarize_batch(sections, sp, cl, ss, batch_size=len(sections))
+
+def _read_pdf(file_path):
+    doc_structure = stream_document(file_path)
+    if doc_structure is None:
+        raise ValueError(f"Could not open PDF: {file_path}")
+    return dict(doc_structure, sections=list(doc_structure["sections"]))
+
+def _assemble(doc_structure, summarized):
+    """
+    Steps 4-5 and the process_document output for a job whose sections
+    have all been summarized; summarized holds (summary or None, hash).
+    """
+    accumulator = ReportAccumulator()
+    sections = []
+    manifest = []
+    for summary, content_hash in summarized:
+        if summary is None:
+            continue
+        sections.append(summary)
+        accumulator.add_section(summary)
+        manifest.append(manifest_entry(summary, content_hash))
+    result = assemble_document(doc_structure, sections, manifest, accumulator)
+    return json.dumps(result, ensure_ascii=False, default=json_default)
+
+class SectionBatcher:
+    """
+    Collects sections from all running jobs and sends them to the worker
+    pool in shared batches: a batch goes out once it has max_batch
+    sections or its first section has waited max_wait seconds, and at most
+    one batch per worker is in flight.
+    """
+    def __init__(self, pool, workers, max_batch=64, max_wait=0.02):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(workers)
+        self.batches = 0
+
+    async def summarize(self, section):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((section, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            self.batches += 1
+            results = await loop.run_in_executor(
+                self.pool, _summarize_batch, [section for section, _ in batch]
+            )
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.slots.release()
+
+class CompressionService:
+    """
+    Local HTTP service around the pipeline. Models stay loaded in a pool
+    of worker processes, accepted jobs wait in a bounded queue, and the
+    sections of concurrently running jobs are micro-batched into shared
+    nlp.pipe calls (see SectionBatcher).
+        POST /jobs               {"doc_structure": {...}} or {"pdf_path": "..."}
+                                 -> 202 {"job_id": ..., "status": "queued"}
+                                 -> 503 when the queue is full
+        GET  /jobs/<id>          status and section progress
+        GET  /jobs/<id>/result   the process_document output once done
+        GET  /health             queue and worker state
+    Only the most recent keep_jobs finished jobs are kept.
+    """
+    def __init__(self, workers=2, max_queue=100, concurrent_jobs=8, max_batch=64,
+                 max_wait=0.02, model=DEFAULT_MODEL, use_senter=False, keep_jobs=1000):
+        self.workers = workers
+        self.concurrent_jobs = concurrent_jobs
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.model = model
+        self.use_senter = use_senter
+        self.keep_jobs = keep_jobs
+        self.jobs = OrderedDict()
+        self.pool = None
+        self.queue = None
+        self.batcher = None
+        self._tasks = []
+
+    #Lifecycle
+    async def start(self):
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(self.model, self.use_senter)
+        )
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.batcher = SectionBatcher(self.pool, self.workers, self.max_batch, self.max_wait)
+        self._tasks = [asyncio.create_task(self.batcher.run())]
+        self._tasks += [asyncio.create_task(self._job_runner()) for _ in range(self.concurrent_jobs)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        await self.start()
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"Compression service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    #Jobs
+    def submit(self, payload):
+        """
+        Queues a job; returns it, or None when the queue is full.
+        """
+        if not isinstance(payload, dict) or not (
+            isinstance(payload.get("doc_structure"), dict) or payload.get("pdf_path")
+        ):
+            raise ValueError("Expected {\"doc_structure\": {...}} or {\"pdf_path\": \"...\"}")
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "submitted": time.time(),
+            "sections_total": None,
+            "sections_done": 0,
+            "error": None,
+            "result": None,
+            "payload": payload
+        }
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return None
+        self.jobs[job["job_id"]] = job
+        return job
+
+    def status(self, job):
+        info = {k: v for k, v in job.items() if k not in ("payload", "result")}
+        if job["status"] == "done":
+            info["seconds"] = round(job["finished"] - job["started"], 3)
+        return info
+
+    async def _job_runner(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job.pop("payload", None)
+                self._forget_old_jobs()
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        job["status"] = "running"
+        job["started"] = time.time()
+        payload = job["payload"]
+        if payload.get("pdf_path"):
+            doc_structure = await loop.run_in_executor(None, _read_pdf, payload["pdf_path"])
+        else:
+            doc_structure = payload["doc_structure"]
+        sections = list(iter_sections(doc_structure))
+        job["sections_total"] = len(sections)
+
+        async def summarize(section):
+            result = await self.batcher.summarize(section)
+            job["sections_done"] += 1
+            return result
+        summarized = await asyncio.gather(*(summarize(s) for s in sections))
+        job["result"] = await loop.run_in_executor(None, _assemble, doc_structure, summarized)
+        job["finished"] = time.time()
+        job["status"] = "done"
+
+    def _forget_old_jobs(self):
+        finished = [k for k, j in self.jobs.items() if j["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.keep_jobs)]:
+            del self.jobs[job_id]
+
+    #HTTP
+    async def _handle(self, reader, writer):
+        try:
+            status, body = await self._respond(reader)
+        except Exception as e:
+            status, body = 400, json.dumps({"error": str(e)})
+        data = body.encode("utf-8")
+        reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                  405: "Method Not Allowed", 409: "Conflict", 503: "Service Unavailable"}
+        writer.write(
+            f"HTTP/1.1 {status} {reason.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise ValueError("Empty request")
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = b""
+        if headers.get("content-length"):
+            body = await reader.readexactly(int(headers["content-length"]))
+        path = urlsplit(target).path.rstrip("/")
+        parts = path.split("/")[1:]
+        if path == "/health":
+            return 200, json.dumps({
+                "workers": self.workers,
+                "queued": self.queue.qsize(),
+                "max_queue": self.max_queue,
+                "running": sum(1 for j in self.jobs.values() if j["status"] == "running"),
+                "batches": self.batcher.batches
+            })
+        if path == "/jobs":
+            if method != "POST":
+                return 405, json.dumps({"error": "Use POST"})
+            job = self.submit(json.loads(body or b"null"))
+            if job is None:
+                return 503, json.dumps({"error": "Job queue is full, retry later"})
+            return 202, json.dumps({"job_id": job["job_id"], "status": job["status"]})
+        if len(parts) in (2, 3) and parts[0] == "jobs" and method == "GET":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, json.dumps({"error": "Unknown job"})
+            if len(parts) == 2:
+                return 200, json.dumps(self.status(job))
+            if parts[2] == "result":
+                if job["status"] != "done":
+                    return 409, json.dumps(self.status(job))
+                return 200, job["result"]
+        return 404, json.dumps({"error": "Not found"})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the compression pipeline as a local HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-w", "--workers", type=int, default=2, help="worker processes (default: 2)")
+    parser.add_argument("--max-queue", type=int, default=100, help="queued jobs before 503 (default: 100)")
+    parser.add_argument("--concurrent-jobs", type=int, default=8,
+                        help="jobs whose sections are batched together (default: 8)")
+    parser.add_argument("--max-batch", type=int, default=64, help="sections per batch (default: 64)")
+    parser.add_argument("--max-wait", type=float, default=0.02,
+                        help="seconds a batch waits to fill up (default: 0.02)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--use-senter", action="store_true")
+    args = parser.parse_args(argv)
+    service = CompressionService(
+        args.workers, args.max_queue, args.concurrent_jobs, args.max_batch,
+        args.max_wait, args.model, args.use_senter
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nService stopped.")
+
+if __name__ == "__main__":
+    main()
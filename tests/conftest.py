@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from stub_nlp import StubNLP
+from synthetic import make_document
+
+@pytest.fixture
+def nlp():
+    """Offline stand-in for the spaCy model (see benchmarks/stub_nlp.py)."""
+    return StubNLP()
+
+@pytest.fixture
+def document():
+    """A small seeded synthetic document: 3 chapters x 3 sections x 10 sentences."""
+    return make_document(3, 3, 10, seed=7)
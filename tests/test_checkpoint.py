@@ -0,0 +1,64 @@
+import copy
+import json
+
+import pytest
+
+from checkpoint import SectionJournal
+from pipeline import process_document
+from records import json_default
+
+class Crash(Exception):
+    pass
+
+def _dump(output):
+    return json.dumps(output, default=json_default)
+
+def _run_until_crash(doc, nlp, journal, sections, compact):
+    done = []
+    def on_section(summarized):
+        done.append(summarized)
+        if len(done) == sections:
+            raise Crash()
+    with pytest.raises(Crash):
+        process_document(doc, nlp=nlp, compact=compact, checkpoint=journal, on_section=on_section)
+    journal.close()
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_resume_after_crash_matches_uninterrupted_run(nlp, document, tmp_path, compact):
+    path = tmp_path / "doc.journal"
+    expected = process_document(copy.deepcopy(document), nlp=nlp, compact=compact)
+    _run_until_crash(copy.deepcopy(document), nlp, SectionJournal(str(path)), 4, compact)
+    journal = SectionJournal(str(path))
+    assert len(journal.entries) == 4
+    result = process_document(copy.deepcopy(document), nlp=nlp, compact=compact, checkpoint=journal)
+    journal.close()
+    assert journal.resumed == 4
+    assert _dump(result) == _dump(expected)
+
+def test_torn_last_line_is_dropped(nlp, document, tmp_path):
+    path = tmp_path / "doc.journal"
+    expected = process_document(copy.deepcopy(document), nlp=nlp)
+    _run_until_crash(copy.deepcopy(document), nlp, SectionJournal(str(path)), 3, False)
+    with open(path, "ab") as f:
+        f.write(b'{"ordinal": 3, "section_id": "2.1", "content_ha')
+    journal = SectionJournal(str(path))
+    assert len(journal.entries) == 3
+    result = process_document(copy.deepcopy(document), nlp=nlp, checkpoint=journal)
+    journal.close()
+    assert journal.resumed == 3
+    assert _dump(result) == _dump(expected)
+    #The torn bytes were cut off before new entries were appended
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["ordinal"] for line in f] == list(range(9))
+
+def test_changed_section_is_not_resumed(nlp, document, tmp_path):
+    path = tmp_path / "doc.journal"
+    _run_until_crash(copy.deepcopy(document), nlp, SectionJournal(str(path)), 4, False)
+    revised = copy.deepcopy(document)
+    revised["chapters"][0]["sections"][1]["raw_text"] = "The board must approve the audit plan."
+    expected = process_document(copy.deepcopy(revised), nlp=nlp)
+    journal = SectionJournal(str(path))
+    result = process_document(copy.deepcopy(revised), nlp=nlp, checkpoint=journal)
+    journal.close()
+    assert journal.resumed == 3
+    assert _dump(result) == _dump(expected)
@@ -0,0 +1,34 @@
+import copy
+import json
+
+from pipeline import process_document
+from records import json_default
+from section_cache import SectionCache
+
+def test_cached_run_matches_uncached_run(nlp, document, tmp_path):
+    cache = SectionCache(str(tmp_path / "cache.sqlite"))
+    expected = process_document(copy.deepcopy(document), nlp=nlp)
+    process_document(copy.deepcopy(document), nlp=nlp, cache=cache)
+    result = process_document(copy.deepcopy(document), nlp=nlp, cache=cache)
+    cache.close()
+    assert cache.hits == 9
+    assert json.dumps(result, default=json_default) == json.dumps(expected, default=json_default)
+
+def test_hits_do_not_commit_but_keep_lru_order(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SectionCache(path, max_bytes=300)
+    for key in "abc":
+        cache.put(key, {"x": key * 50})
+    changes = cache._db.total_changes
+    assert cache.get("a") is not None
+    assert cache._db.total_changes == changes
+    #"a" was used most recently, so b and c are evicted first
+    cache.put("d", {"x": "d" * 100})
+    cache.put("e", {"x": "e" * 100})
+    assert cache.get("a") is not None
+    assert cache.get("b") is None and cache.get("c") is None
+    cache.close()
+    reopened = SectionCache(path)
+    order = [k for (k,) in reopened._db.execute("SELECT key FROM sections ORDER BY last_used")]
+    reopened.close()
+    assert order == ["d", "e", "a"]
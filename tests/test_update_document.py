@@ -0,0 +1,79 @@
+import copy
+import json
+
+import pytest
+
+from budget import NoteBudget
+from metrics import PipelineMetrics
+from pipeline import process_document, update_document
+from records import json_default
+
+def _dump(output, *drop):
+    return json.dumps({k: v for k, v in output.items() if k not in drop}, default=json_default)
+
+def _edit(doc, chapter, section, text):
+    doc = copy.deepcopy(doc)
+    doc["chapters"][chapter]["sections"][section]["raw_text"] = text
+    return doc
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_unchanged_document_matches_full_run(nlp, document, compact):
+    previous = process_document(copy.deepcopy(document), nlp=nlp, compact=compact)
+    full = process_document(copy.deepcopy(document), nlp=nlp, compact=compact)
+    updated = update_document(previous, copy.deepcopy(document), nlp=nlp, compact=compact)
+    assert updated["changes"] == {"added": [], "removed": [], "changed": [], "unchanged": 9}
+    assert _dump(updated, "changes") == _dump(full)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_changed_section_matches_full_run(nlp, document, compact):
+    previous = process_document(copy.deepcopy(document), nlp=nlp, compact=compact)
+    revised = _edit(document, 2, 0, "The licensee must renew the permit within 30 days.")
+    full = process_document(copy.deepcopy(revised), nlp=nlp, compact=compact)
+    updated = update_document(previous, copy.deepcopy(revised), nlp=nlp, compact=compact)
+    assert updated["changes"]["changed"] == ["3.1"]
+    assert updated["changes"]["unchanged"] == 8
+    assert _dump(updated, "changes") == _dump(full)
+
+def test_added_and_removed_sections(nlp, document):
+    previous = process_document(copy.deepcopy(document), nlp=nlp)
+    revised = copy.deepcopy(document)
+    removed = revised["chapters"][1]["sections"].pop(1)
+    revised["chapters"][0]["sections"].append({
+        "section_id": "1.9", "Title": "New", "page_range": [40, 40],
+        "raw_text": "Each contractor shall file the annual report."
+    })
+    full = process_document(copy.deepcopy(revised), nlp=nlp)
+    updated = update_document(previous, copy.deepcopy(revised), nlp=nlp)
+    assert updated["changes"]["added"] == ["1.9"]
+    assert updated["changes"]["removed"] == [removed["section_id"]]
+    assert _dump(updated, "changes") == _dump(full)
+
+def test_rejects_budget_on_update(nlp, document):
+    previous = process_document(copy.deepcopy(document), nlp=nlp)
+    with pytest.raises(ValueError):
+        update_document(previous, copy.deepcopy(document), nlp=nlp, budget=NoteBudget(max_notes=5))
+
+def test_rejects_previous_trimmed_by_budget(nlp, document):
+    previous = process_document(copy.deepcopy(document), nlp=nlp, budget=NoteBudget(max_notes=5))
+    revised = _edit(document, 2, 0, "The licensee must renew the permit within 30 days.")
+    with pytest.raises(ValueError, match="note budget"):
+        update_document(previous, revised, nlp=nlp)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_json_loaded_previous_with_moved_pages(nlp, document, compact):
+    previous = process_document(copy.deepcopy(document), nlp=nlp, compact=compact)
+    previous = json.loads(json.dumps(previous, default=json_default))
+    revised = _edit(document, 2, 0, "The licensee must renew the permit within 30 days.")
+    for chapter in revised["chapters"]:
+        for section in chapter["sections"]:
+            section["page_range"] = [page + 5 for page in section["page_range"]]
+    full = process_document(copy.deepcopy(revised), nlp=nlp, compact=compact)
+    updated = update_document(previous, copy.deepcopy(revised), nlp=nlp, compact=compact)
+    assert updated["changes"]["changed"] == ["3.1"]
+    assert _dump(updated, "changes") == _dump(full)
+
+def test_update_drops_stale_metrics(nlp, document):
+    previous = process_document(copy.deepcopy(document), nlp=nlp, metrics=PipelineMetrics())
+    assert "metrics" in previous
+    updated = update_document(previous, copy.deepcopy(document), nlp=nlp)
+    assert "metrics" not in updated